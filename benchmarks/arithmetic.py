@@ -0,0 +1,41 @@
+'''
+Benchmark the counting channel expression evaluator.
+
+Run from the repository root with:
+    python -m benchmarks.arithmetic
+'''
+
+import timeit
+from utils.arithmetic import evaluate, ExpressionError, parse_expression
+
+EXPRESSIONS = {
+    'plain number': "1234",
+    'simple sum': "600 + 34",
+    'nested': "((3+4)*(2-1)) % 5 + 10 // 3",
+    'float': "2.5 * 4 / 0.5",
+    'large power': "9**9**9",
+    'large product': "*".join(["99999999999"] * 40),
+    'many operations': "+".join(["1"] * 200),
+    'division by zero': "1/0",
+    'invalid': "1.2.3",
+}
+
+
+def run(source: str, cached: bool) -> float:
+    def target():
+        if not cached:
+            evaluate.cache_clear()
+            parse_expression.cache_clear()
+        try:
+            evaluate(source)
+        except ExpressionError:
+            pass
+
+    number = 2000
+    return min(timeit.repeat(target, number=number, repeat=5)) / number * 1e6
+
+
+if __name__ == '__main__':
+    print(f"{'expression':<20}{'uncached (us)':>16}{'cached (us)':>16}")
+    for name, source in EXPRESSIONS.items():
+        print(f"{name:<20}{run(source, False):>16.2f}{run(source, True):>16.2f}")
@@ -4,16 +4,21 @@ from discord.ext import commands
 from datetime import datetime
 import pymongo
 from utils.constants import DEFAULT_PREFIX, DISCORD_API_KEY, FMT, OPENAI_API_KEY
-from utils.database import db
+from utils.cache import server_cache
+from utils.guildindex import member_guilds
+from utils.members import ensure_member_indexes
+from utils.migrations import migrate_departure_expiry
+from utils.polls import poll_votes
+from utils.transcripts import ensure_transcript_indexes
 
 
 GPT_ENABLED = True # CHANGE THIS IF YOU DO NOT HAVE A GPT-3 Beta key
 intents = discord.Intents.all()
 
 
-def prefix(bot, message):
+async def prefix(bot, message):
     try:
-        return db['Servers'].find_one({'_id': message.guild.id})['prefix']
+        return (await server_cache.get(message.guild.id))['prefix']
     except (AttributeError, TypeError):
         return DEFAULT_PREFIX
 
@@ -28,6 +33,7 @@ extensions = [
     "cogs.LevelCommandsCog",
     "cogs.LevelListenersCog",
     "cogs.MarriageCommandsCog",
+    "cogs.MessageListenersCog",
     "cogs.ModeratorCommandsCog",
     "cogs.ModeratorListenersCog",
     "cogs.PollCommandsCog",
@@ -50,13 +56,32 @@ gpt_cogs = [
     "cogs.GPT-StoryCog"
 ]
 
+database_setup = [
+    ensure_member_indexes,
+    migrate_departure_expiry,
+    ensure_transcript_indexes,
+    poll_votes.ensure_indexes
+]
+
 @bot.event
 async def on_ready():
     print(f"[{datetime.utcnow().strftime(FMT)}]\t Discord Assistant ready!")
+    # Every cached member, guilds that are not chunked yet are chunked
+    # and indexed completely by BatchUpdaterCog
+    member_guilds.build(bot.guilds)
     await load()
 
 
 async def load():
+    # A failing index or migration is retried on the next start,
+    # it should not keep the cogs from loading
+    for setup in database_setup:
+        try:
+            await setup()
+        except Exception as error:
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Database setup {setup.__qualname__} failed: {error!r}")
+
     try:
         for ext in extensions:
             bot.load_extension(ext)
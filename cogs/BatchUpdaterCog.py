@@ -2,147 +2,131 @@ import asyncio
 from datetime import datetime, timedelta
 import discord
 from discord.ext import commands, tasks
-from utils.constants import DEFAULT_CHANNELS, DEFAULT_MANAGERS
+import time
+from utils.cache import server_cache
+from utils.constants import FMT
 from utils.database import db
-from package_tools import add_user_to_database
+from utils.guildindex import index_guild
+from utils.members import sync_guild_members
+from utils.messages import message_tracker
+from utils.mutes import mute_scheduler, RETRY_DELAY as MUTE_RETRY_DELAY
+from utils.reconciler import IntegrityReconciler
 
-DEFAULT_CHANNELS = ['spawn', 'eject', 'log', 'birthday']
-DEFAULT_MANAGERS = ['role_managers', 'polls', 'events']
-TIMEDELTA_DELETE_INFO = timedelta(days=14)
+# Time the TTL monitor may lag behind before expired data is removed by hand
+TTL_GRACE = timedelta(hours=1)
 
 
 class BatchUpdaterCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.member_sync_stats = {}
         self.check_user_information.start()
-        self.check_important_roles.start()
-        self.check_property_channels.start()
-        self.check_important_channels.start()
-        self.check_important_managers.start()
+        self.reconciler = IntegrityReconciler(bot)
+        self.reconcile_servers.start()
         self.user_information_removal.start()
-        self.check_unmutes.start()
+        self.unmutes_restart = None
+        self.start_unmutes()
+
+    def start_unmutes(self):
+        self.unmutes = self.bot.loop.create_task(mute_scheduler.run(self.lift_mute))
+        self.unmutes.add_done_callback(self.unmutes_done)
+
+    def unmutes_done(self, task):
+        '''Restart the mute scheduler if it died, it is meant to run forever'''
+        if task.cancelled():
+            return
+        print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+              f"Mute scheduler stopped unexpectedly: {task.exception()!r}, restarting")
+        self.unmutes_restart = self.bot.loop.call_later(
+            MUTE_RETRY_DELAY.total_seconds(), self.start_unmutes)
 
     def cog_unload(self):
         self.check_user_information.stop()
-        self.check_important_roles.stop()
-        self.check_property_channels.stop()
-        self.check_important_channels.stop()
-        self.check_important_managers.stop()
+        self.reconcile_servers.stop()
         self.user_information_removal.stop()
-        self.check_unmutes.stop()
+        self.unmutes.cancel()
+        if self.unmutes_restart:
+            self.unmutes_restart.cancel()
 
     @tasks.loop(minutes=5.0)
     async def check_user_information(self):
-        '''Loop through all guilds and see if there are any users not in db'''
-        async for guild in self.bot.fetch_guilds():
-            async for member in guild.fetch_members():
-                add_user_to_database(member)
+        '''Sync the stored memberships of all guilds with the gateway cache'''
+        start = time.perf_counter()
+        scanned = changed = failed = 0
+        for guild in self.bot.guilds:
+            try:
+                # Also refreshes the member index of guilds chunked elsewhere
+                await index_guild(guild)
+                guild_scanned, guild_changed = await sync_guild_members(guild)
+            except Exception as error:
+                # One guild failing should not stop the sync of the others
+                failed += 1
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"Could not sync members of guild {guild.id}: {error!r}")
+                continue
+            scanned += guild_scanned
+            changed += guild_changed
+
+        self.member_sync_stats = {
+            'scanned': scanned,
+            'changed': changed,
+            'failed': failed,
+            'elapsed': time.perf_counter() - start
+        }
+        print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+              f"Member sync scanned {scanned} members, changed {changed}",
+              f"({failed} guilds failed) in {self.member_sync_stats['elapsed']:.2f}s")
+
+    @commands.Cog.listener()
+    async def on_raw_message_delete(self, payload):
+        '''Remember deletes so stored messages need no fetch to verify'''
+        message_tracker.mark_deleted(payload.message_id)
+
+    @commands.Cog.listener()
+    async def on_raw_bulk_message_delete(self, payload):
+        for message_id in payload.message_ids:
+            message_tracker.mark_deleted(message_id)
 
     @tasks.loop(hours=1.0)
-    async def check_important_roles(self):
-        '''Check if all important saved roles are still in guild'''
-        for server in db['Servers'].find():
-            guild = await self.bot.fetch_guild(server['_id'])
-            for role, role_id in server['roles'].items():
-                if not guild.get_role(role_id):
-                    db['Servers'].update_one({'_id': guild.id},
-                        {'$unset': {f'roles.{role}': ''}})
-
-    @tasks.loop(hours=1.0)
-    async def check_property_channels(self):
-        for server in db['Servers'].find():
-            guild = await self.bot.fetch_guild(server['_id'])
-            for channel_id in server['channels']['ignore_exp']:
-                try:
-                    channel = await self.bot.fetch_channel(channel_id)
-                except discord.NotFound:
-                    db['Servers'].update_one({'_id': guild.id},
-                        {'$pull': {'channels.ignore_exp': channel_id}})
-
-    @tasks.loop(hours=1.0)
-    async def check_important_channels(self):
-        '''Check if all important saved channels are still in guild'''
-        for server in db['Servers'].find():
-            guild = await self.bot.fetch_guild(server['_id'])
-            for channel in DEFAULT_CHANNELS:
-                unset = False
-                try:
-                    channel_id = server['channels'][channel]
-                except KeyError:
-                    continue
-                else:
-                    try:
-                        channel = await self.bot.fetch_channel(channel_id)
-                    except discord.NotFound:
-                        db['Servers'].update_one({'_id': guild.id},
-                            {'$unset': {f'channels.{channel}': ''}})
-
-    @tasks.loop(hours=1.0)
-    async def check_important_managers(self):
-        '''Check if all important saved messages are in still in guild'''
-        for server in db['Servers'].find():
-            guild = await self.bot.fetch_guild(server['_id'])
-            for default_manager in DEFAULT_MANAGERS:
-                for manager, info in server[default_manager].items():
-                    channel = await self.bot.fetch_channel(info['channel'])
-                    try:
-                        message = await channel.fetch_message(manager)
-                    except discord.NotFound:
-                        db['Servers'].update_one({'_id': guild.id},
-                            {'$unset': {f'{default_manager}.{manager}': ''}})
-
+    async def reconcile_servers(self):
+        '''Remove stored roles, channels and manager messages that no longer exist'''
+        try:
+            await self.reconciler.run()
+        except Exception as error:
+            # E.g. the server documents could not be read, retried next hour
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Could not reconcile servers: {error!r}")
 
     @tasks.loop(hours=1.0)
     async def user_information_removal(self):
-        '''After 2 weeks of absence remove user information from a server'''
-        # Get time minus delay
-        now_minus_delay = datetime.utcnow() - TIMEDELTA_DELETE_INFO
-        # Get all (recently) connected servers
-        for server in db['Servers'].find():
-            # Remove server information from user if longer ago then set delay.
-            db['Users'].update_many({f'servers.{server["_id"]}.leave_date': {'$lt': now_minus_delay}},
-                {'$unset': {f'servers.{server["_id"]}': ''},})
-        # Set a leave date if a user is no longer connected to any server
-        db['Users'].update_many({'servers': {}},
-            {'$set': {'leave_date': datetime.utcnow()}})
-        # Delete any users from the database that are not connected to a server
-        db['Users'].delete_many({'leave_date': {'$lt': now_minus_delay}})
-
-
-    @tasks.loop(minutes=1.0)
-    async def check_unmutes(self):
         '''
-        Loop through users documents
-            Loop through servers of users
-                check if muted until
-                    if muted until < datetime.utcnow():
-                        check if leave_date
-                        unmute
-        ''' # TODO: Complete documentation
-        users = db['Users'].find()
-        for user in users:
-            for guild_id, guild_info in user['servers'].items():
-                try:
-                    muted_until = guild_info['muted_until']
-                except KeyError:
-                    continue
-
-                if not muted_until < datetime.utcnow():
-                    continue
-
-                server = db['Servers'].find_one({'_id': int(guild_id)})
-                try:
-                    role_id = server['roles']['muted']
-                except KeyError:  # Doesn't exist
-                    continue
-                else:
-                    guild = await self.bot.fetch_guild(int(guild_id))
-                    role = guild.get_role(role_id)
-                    try:
-                        member = await guild.fetch_member(user['_id'])
-                    except discord.NotFound:
-                        continue
-                    await member.remove_roles(role)
+        Verify that departed members and users are being expired.
+
+        MongoDB removes them through the TTL indexes on `expire_at`, this
+        only checks the (indexed) amount of documents that are overdue by
+        more than the TTL monitor's usual delay, and removes those if the
+        monitor is not keeping up.
+        '''
+
+        overdue = {'expire_at': {'$lt': datetime.utcnow() - TTL_GRACE}}
+        for collection in ('Members', 'Users'):
+            if await db[collection].count_documents(overdue, limit=1):
+                result = await db[collection].delete_many(overdue)
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"TTL expiry is behind, removed {result.deleted_count}",
+                      f"overdue documents from {collection}")
+
+    async def lift_mute(self, guild_id: int, user_id: int):
+        '''Remove the muted role of a member whose mute expired'''
+        server = await server_cache.get(guild_id)
+        guild = self.bot.get_guild(guild_id)
+        try:
+            role = guild.get_role(server['roles']['muted'])
+        except (AttributeError, KeyError, TypeError):  # Doesn't exist
+            return
+        member = guild.get_member(user_id)
+        if member and role:
+            await member.remove_roles(role)
 
 
 def setup(bot):
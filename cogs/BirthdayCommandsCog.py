@@ -2,6 +2,7 @@ import asyncio
 from datetime import datetime
 import discord
 from discord.ext import commands
+from utils.birthdays import birthday_scheduler, birthday_window
 from utils.constants import FMT, FMT_DATE, FMT_TIME, TIMEZONE_CATEGORIES
 from utils.database import db
 from utils.menu import Menu
@@ -21,12 +22,12 @@ class BirthdayCommandsCog(commands.Cog):
 
     @commands.command()
     async def birthday(self, ctx):
-        user = db['Users'].find_one({'_id': ctx.author.id})
+        user = await db['Users'].find_one({'_id': ctx.author.id})
         try:
             birth_date = user['birthday']
             timezone = user['timezone']
         except KeyError:
-            prefix = db['Servers'].find_one({'_id': ctx.guild.id})['prefix']
+            prefix = (await db['Servers'].find_one({'_id': ctx.guild.id}))['prefix']
             await ctx.send(f"You have not setup a birthday yet! Command: {prefix}set_birthday")
             return
         else:
@@ -166,14 +167,20 @@ class BirthdayCommandsCog(commands.Cog):
 
         await menu.stop()
         # Update database information
-        db['Users'].update_one({'_id': ctx.author.id},
-            {'$set': {
-                'birthday': birthday,
-                'timezone': timezone,
-                'has_birthday_role': False
-                }
-            }
-        )
+        start, end = birthday_window(birthday, timezone)
+        update = {
+            'birthday': birthday,
+            'timezone': timezone,
+            'birthday_start': start,
+            'birthday_end': end
+        }
+        # A running birthday that moved away ends now, the scheduler then
+        # takes the role and schedules the new date
+        user = await db['Users'].find_one({'_id': ctx.author.id}, {'has_birthday_role': 1})
+        if user and user.get('has_birthday_role') and start > datetime.utcnow():
+            update['birthday_end'] = datetime.utcnow()
+        await db['Users'].update_one({'_id': ctx.author.id}, {'$set': update})
+        birthday_scheduler.wake()
 
         await dm_channel.send(f"Your birthday has been updated to {birthday.strftime(FMT_DATE)}!")
 
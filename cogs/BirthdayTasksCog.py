@@ -1,63 +1,49 @@
-from datetime import date, datetime
+from datetime import datetime
 import discord
-from discord.ext import commands, tasks
+from discord.ext import commands
 from package_tools import get_shared_guilds
-import pytz
-from utils.constants import FMT_DATE_NO_YEAR
-from utils.database import db
+from utils.birthdays import birthday_scheduler
+from utils.cache import server_cache
+from utils.constants import FMT
+from utils.roles import role_updates
 
 
 class BirthdayTasksCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        self.check_birthdays.start()
+        self._counters = (0, 0)
+        self.birthdays = self.bot.loop.create_task(
+            birthday_scheduler.run(self.update_birthday_role, self.report_cycle))
 
     def cog_unload(self):
-        self.check_birthdays.stop()
+        self.birthdays.cancel()
 
-    @tasks.loop(minutes=5.0)
-    async def check_birthdays(self):
-        '''Batch updater for birthdays'''
+    async def update_birthday_role(self, user_id: int, has_birthday: bool):
+        '''Give or take the birthday role in all guilds shared with a user'''
 
-        # Iterate over all users in database
-        for user in db['Users'].find():
-            # Check if user ever entered a birthday
+        guilds = await get_shared_guilds(self.bot, user_id)
+        for guild in guilds:
+            server = await server_cache.get(guild.id)
             try:
-                birthday = user['birthday']
-                timezone = user['timezone']
-            except KeyError:
+                role = guild.get_role(server['roles']['birthday'])
+            except (KeyError, TypeError):
                 continue
-
-            # Check whether it's their birthday
-            if (
-                datetime.now(pytz.timezone(timezone)).strftime(FMT_DATE_NO_YEAR)
-                ==
-                birthday.astimezone(pytz.timezone(timezone)).strftime(FMT_DATE_NO_YEAR)
-            ):
-                update_role = True
-            else:
-                update_role = False
-
-            guilds = await get_shared_guilds(self.bot, user['_id'])
-            for guild in guilds:
-                server = db['Servers'].find_one({'_id': guild.id})
-                try:
-                    role_id = server['roles']['birthday']
-                except KeyError:
-                    continue
-                else:
-                    role = guild.get_role(role_id)
-                    member = guild.get_member(user['_id'])
-
-                    if update_role:
-                        await member.add_roles(role)
-                    else:
-                        await member.remove_roles(role)
-
-            db['Users'].update_one({'_id': user['_id']},
-                {'$set': {'has_birthday_role': update_role}})
-
-            # TODO: ADD BIRTHDAY MESSAGE
+            member = guild.get_member(user_id)
+            if role and member:
+                role_updates.put(member, role, has_birthday)
+
+        # TODO: ADD BIRTHDAY MESSAGE
+
+    async def report_cycle(self, transitions: int):
+        '''Log the role requests made and avoided for a birthday boundary'''
+
+        await role_updates.join()
+        applied, avoided = role_updates.applied, role_updates.avoided
+        previous_applied, previous_avoided = self._counters
+        self._counters = (applied, avoided)
+        print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+              f"{transitions} birthday transitions, {applied - previous_applied} role requests,",
+              f"{avoided - previous_avoided} avoided")
 
 
 def setup(bot):
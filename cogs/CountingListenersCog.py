@@ -1,28 +1,49 @@
 from datetime import datetime
 import discord
-from discord.ext import commands
-from utils.constants import EXPRESSIONS
-from utils.database import db
+from discord.ext import commands, tasks
+from utils.arithmetic import evaluate, ExpressionError
+from utils.constants import COUNTING_FLUSH_INTERVAL, EXPRESSIONS, FMT
+from utils.counting import counting_store
+from utils.pipeline import message_pipeline
 
 
 class CountingListenersCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        message_pipeline.register('counting', 20, self.count)
+        self.flush_counting.start()
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        # Should message be handled?
-        # Check if message not by a bot, in textchannel and only containing proper info
-        if (
-            message.author.bot or
-            not isinstance(message.channel, discord.TextChannel) or
-            any(char not in EXPRESSIONS and not char.isdigit() for char in message.content)
-        ):
+    def cog_unload(self):
+        message_pipeline.unregister('counting')
+        # Cancelling runs the after_loop hook, which forces a final flush
+        self.flush_counting.cancel()
+
+    @tasks.loop(seconds=COUNTING_FLUSH_INTERVAL)
+    async def flush_counting(self):
+        '''Periodically write changed counting states'''
+        try:
+            await counting_store.flush()
+        except Exception as error:
+            # Unwritten states stay dirty, a raise would stop the loop for good
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Could not flush counting states: {error!r}")
+
+    @flush_counting.after_loop
+    async def after_flush_counting(self):
+        '''Flush whatever is left on cog unload or bot shutdown'''
+        await counting_store.flush()
+
+    async def count(self, context):
+        '''Message pipeline stage judging counting channel messages'''
+
+        # Check if message only contains proper info
+        message = context.message
+        if any(char not in EXPRESSIONS and not char.isdigit() for char in message.content):
             return
 
         # Get server info and channel id for counting
         guild = message.guild
-        server = db['Servers'].find_one({'_id': guild.id})
+        server = context.server
         try:
             count_channel_id = server['channels']['counting']
         except KeyError:
@@ -34,27 +55,18 @@ class CountingListenersCog(commands.Cog):
 
         # Evaluate the expression
         try:
-            evaluation = eval(message.content)
-        except SyntaxError:
+            evaluation = evaluate(message.content)
+        except ExpressionError:
             return
 
-        current = server['counting'].get('current', 1)
-        last_counter = server['counting'].get('last_counter', None)
-
-        if evaluation == current and message.author.id != last_counter:
+        # Judged in memory, the state is written by flush_counting
+        correct, current = await counting_store.judge(guild.id, evaluation, message.author.id)
+        if correct:
             await message.add_reaction('👍')
-
-            db['Servers'].update_one({'_id': guild.id},
-                {'$inc': {'counting.current': 1},
-                 '$set': {'counting.last_counter': message.author.id}})
-
         else:
             await message.add_reaction('👎')
             await message.channel.send(f"{message.author.name} fucked it up at {current}!")
 
-            db['Servers'].update_one({'_id': guild.id},
-                {'$set': {'counting.current': 1, 'counting.last_counter': 0}})
-
 
 def setup(bot):
     bot.add_cog(CountingListenersCog(bot))
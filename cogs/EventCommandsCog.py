@@ -2,6 +2,7 @@ from datetime import datetime, date, time
 import discord
 from discord.ext import commands
 import pytz
+from utils.cache import server_cache
 from utils.constants import EVENT_COLOUR, EVENT_EMOTES, FMT_TIME, NUMBER_EMOTES_UNICODE, TIMEZONE_CATEGORIES, TOTAL_BARS
 from utils.database import db
 from utils.menu import Menu
@@ -250,9 +251,10 @@ class EventCommandsCog(commands.Cog):
         #                                              colour=EVENT_COLOUR)
         # event['role'] = attending_role.id
         event['channel'] = ctx.channel.id
-        db['Servers'].update_one({'_id': ctx.guild.id},
+        await db['Servers'].update_one({'_id': ctx.guild.id},
             {'$set': {f'events.{event_message.id}': event}}
         )
+        server_cache.invalidate(ctx.guild.id)
 
 
 def setup(bot):
@@ -12,7 +12,7 @@ class EventListenersCog(commands.Cog):
 
     async def update_event(self, payload):
 
-        server = db['Servers'].find_one({'_id': payload.guild_id})
+        server = await db['Servers'].find_one({'_id': payload.guild_id})
         try:
             event = server['events'][str(payload.message_id)]
         except KeyError:
@@ -2,10 +2,14 @@ import asyncio
 import discord
 from discord.ext import commands
 import math
-from package_tools import exp_to_level, get_emoji_number, level_to_exp
+from package_tools import get_emoji_number
 import re
-from utils.constants import NUMBER_EMOTES_UNICODE, TOTAL_BARS
+from utils.cache import server_cache, TTLCache
+from utils.constants import LEADERBOARD_PAGE_SIZE, LEADERBOARD_SIZE, LEADERBOARD_TTL, NUMBER_EMOTES_UNICODE, TOTAL_BARS
 from utils.database import db
+from utils.experience import experience_buffer
+from utils.levels import get_level_curve, LEVEL_CURVES
+from utils.members import get_member
 from utils.menu import Menu
 from utils.page import Page, EmbeddedPage
 
@@ -13,53 +17,75 @@ from utils.page import Page, EmbeddedPage
 class LevelCommandsCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.leaderboards = TTLCache(LEADERBOARD_TTL)
 
     @commands.command()
     @commands.guild_only()
     async def rank(self, ctx):
-        user = db['Users'].find_one({'_id': ctx.author.id})
+        # Buffered experience grants must be written for the count to be exact
+        await experience_buffer.flush()
+
+        member = await get_member(ctx.guild.id, ctx.author.id)
         try:
-            user_exp = user['servers'][str(ctx.guild.id)]['experience']
+            user_exp = member['experience']
         except (KeyError, TypeError):
             await ctx.send("No record found!")
             return
 
-        users = list(db['Users'].find({f'servers.{ctx.guild.id}': {'$exists': True}}))
-        users_exp = []
-        for user in users:
-            try:
-                users_exp.append(user['servers'][str(ctx.guild.id)]['experience'])
-            except KeyError:
-                continue
-        users_exp.sort(reverse=True)
+        # Count members ahead on the (guild_id, experience, user_id) index,
+        # ties are ordered by user id so ranks are unique
+        ahead = await db['Members'].count_documents({'guild_id': ctx.guild.id, '$or': [
+            {'experience': {'$gt': user_exp}},
+            {'experience': user_exp, 'user_id': {'$lt': ctx.author.id}}
+        ]})
 
-        rank = users_exp.index(user_exp) + 1
+        rank = ahead + 1
         await ctx.send(f"You are ranked #{rank} in this server!")
 
     @commands.command()
     @commands.guild_only()
     async def top(self, ctx):
-        top = db['Users'].find({f'servers.{ctx.guild.id}.experience': {'$exists': True}})
-        top = list(top)
-        top = sorted(top, key=lambda x: x['servers'][str(ctx.guild.id)]['experience'], reverse=True)
-        top = top[:80]
-        ranking = []
-        for itr, user in enumerate(top):
-            member = ctx.guild.get_member(user['_id'])
-            if not member:
-                continue
-            user_server = user['servers'][str(ctx.guild.id)]
-            exp = user_server['experience']
-            ranking.append(f"{get_emoji_number(itr+1)} {member.name} - Level: {exp_to_level(exp)} | {exp}")
-
-        per_page = 8
-        pages = [ranking[i:i+per_page] for i in range(0, len(ranking), per_page)]
+        query = {'guild_id': ctx.guild.id, 'experience': {'$exists': True}}
+        total = self.leaderboards.get((ctx.guild.id, 'total'))
+        if total is None:
+            total = await db['Members'].count_documents(query, limit=LEADERBOARD_SIZE)
+            self.leaderboards.set((ctx.guild.id, 'total'), total)
+
+        if not total:
+            await ctx.send("No one has gained any experience in this server yet!")
+            return
+
+        async def load_page(page_number):
+            '''Fetch only the rows of one leaderboard page'''
+            key = (ctx.guild.id, page_number)
+            rows = self.leaderboards.get(key)
+            if rows is None:
+                offset = (page_number-1) * LEADERBOARD_PAGE_SIZE
+                cursor = db['Members'].find(query, {'_id': 0, 'user_id': 1, 'experience': 1}).sort(
+                    [('experience', -1), ('user_id', 1)]).skip(offset).limit(LEADERBOARD_PAGE_SIZE)
+                rows = [
+                    (offset+itr+1, member['user_id'], member['experience'])
+                    for itr, member in enumerate(await cursor.to_list(LEADERBOARD_PAGE_SIZE))
+                ]
+                self.leaderboards.set(key, rows)
+
+            curve = get_level_curve(await server_cache.get(ctx.guild.id))
+            levels = curve.exp_to_levels(exp for _, _, exp in rows)
+            ranking = []
+            for (position, user_id, exp), level in zip(rows, levels):
+                member = ctx.guild.get_member(user_id)
+                if not member:
+                    continue
+                ranking.append(f"{get_emoji_number(position)} {member.name} - Level: {level} | {exp}")
+            return ranking or "No members on this page are still in the server."
 
+        page_count = math.ceil(total / LEADERBOARD_PAGE_SIZE)
         menu = Menu (
             bot=self.bot,
             channel=ctx.channel,
             interactors=[ctx.author],
-            pages=pages,
+            pages=[None] * page_count,
+            page_loader=load_page,
             title="Level ranking for this server.",
             remove_message_after=True,
             all_embedded=True
@@ -72,17 +98,18 @@ class LevelCommandsCog(commands.Cog):
     async def level(self, ctx, member: discord.Member=None):
         if not member:
             member = ctx.author
-        user = db['Users'].find_one({'_id': member.id})
+        membership = await get_member(ctx.guild.id, member.id)
         try:
-            exp = user['servers'][str(ctx.guild.id)]['experience']
+            exp = membership['experience']
         except (KeyError, TypeError):
             await ctx.send("Something went wrong, please try again later!")
             return
 
-        current_level = exp_to_level(exp)
-        exp_req_current_level = level_to_exp(current_level)
+        curve = get_level_curve(await server_cache.get(ctx.guild.id))
+        current_level = curve.exp_to_level(exp)
+        exp_req_current_level = curve.level_to_exp(current_level)
         exp_gained_current_level = exp - exp_req_current_level
-        exp_req_next_level = level_to_exp(current_level+1)
+        exp_req_next_level = curve.level_to_exp(current_level+1)
         exp_req_level_up = exp_req_next_level - exp_req_current_level
 
         fraction = exp_gained_current_level/exp_req_next_level
@@ -150,6 +177,22 @@ class LevelCommandsCog(commands.Cog):
         }
         await submenus[selection](ctx)
 
+    @commands.command()
+    @commands.guild_only()
+    @commands.has_permissions(administrator=True)
+    async def set_level_curve(self, ctx, name: str=None):
+        '''Pick the experience curve used for levels in this server'''
+
+        if name not in LEVEL_CURVES:
+            current = get_level_curve(await server_cache.get(ctx.guild.id))
+            curves = '\n'.join(f"**{curve.name}**: {curve.description}" for curve in LEVEL_CURVES.values())
+            await ctx.send(f"This server uses the **{current.name}** curve. Available curves:\n{curves}")
+            return
+
+        await db['Servers'].update_one({'_id': ctx.guild.id}, {'$set': {'level_curve': name}})
+        server_cache.invalidate(ctx.guild.id)
+        await ctx.send(f"Levels in this server now follow the {name} curve.")
+
     @commands.command()
     @commands.guild_only()
     @commands.has_permissions(administrator=True)
@@ -162,7 +205,7 @@ class LevelCommandsCog(commands.Cog):
             remove_message_after=True
         )
 
-        level_roles = db['Servers'].find_one({'_id': ctx.guild.id})['roles']
+        level_roles = (await db['Servers'].find_one({'_id': ctx.guild.id}))['roles']
 
         prefix, roles = [], []
         if level_roles:
@@ -240,9 +283,10 @@ class LevelCommandsCog(commands.Cog):
         role = input.content
         role_id = int(re.sub("[<@&>]", '', role))
 
-        db['Servers'].update_one({'_id': ctx.guild.id},
+        await db['Servers'].update_one({'_id': ctx.guild.id},
             {'$set': {f'roles.{str(level)}': role_id}}
         )
+        server_cache.invalidate(ctx.guild.id)
         await menu.stop()
         await ctx.send(f"Role {role} will now be obtained upon reaching level {level}.")
 
@@ -271,7 +315,7 @@ class LevelCommandsCog(commands.Cog):
             )
 
 
-        server = db['Servers'].find_one({'_id': ctx.guild.id})
+        server = await db['Servers'].find_one({'_id': ctx.guild.id})
         ignore_exp_channels = [f"<#{channel_id}>" for channel_id in server['channels']['ignore_exp']]
 
         exp_channel_page = Page (
@@ -291,11 +335,13 @@ class LevelCommandsCog(commands.Cog):
         channel_id = int(re.sub('[<#>]', '', input.content))
 
         if channel_id in server['channels']['ignore_exp']:
-            db['Servers'].update_one({'_id': ctx.guild.id},
+            await db['Servers'].update_one({'_id': ctx.guild.id},
                 {'$pull': {'channels.ignore_exp': channel_id}})
+            server_cache.invalidate(ctx.guild.id)
         else:
-            db['Servers'].update_one({'_id': ctx.guild.id},
+            await db['Servers'].update_one({'_id': ctx.guild.id},
                 {'$addToSet': {'channels.ignore_exp': channel_id}})
+            server_cache.invalidate(ctx.guild.id)
 
         await menu.stop()
         await ctx.send(f"Experience gain has been toggled in channel <#{channel_id}>!")
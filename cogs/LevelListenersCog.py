@@ -1,48 +1,70 @@
 from datetime import datetime
 import discord
-from discord.ext import commands
-from package_tools import exp_to_level
-from utils.constants import DEFAULT_EXP_INCREASE, EPOCH
-from utils.database import db
+from discord.ext import commands, tasks
+from utils.constants import DEFAULT_EXP_INCREASE, EXPERIENCE_FLUSH_INTERVAL, FMT
+from utils.experience import experience_buffer, experience_cooldowns
+from utils.levels import get_level_curve
+from utils.pipeline import message_pipeline
 
 
 class LevelListenerCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        message_pipeline.register('experience', 30, self.grant_experience)
+        self.flush_experience.start()
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
+    def cog_unload(self):
+        message_pipeline.unregister('experience')
+        # Cancelling runs the after_loop hook, which forces a final flush
+        self.flush_experience.cancel()
 
-        # Check if message by bot or message a DM.
-        if (
-            message.author.bot or
-            isinstance(message.channel, discord.DMChannel) or
-            message.channel.id in db['Servers'].find_one(
-                {'_id': message.guild.id})['channels']['ignore_exp']
-        ):
+    @tasks.loop(seconds=EXPERIENCE_FLUSH_INTERVAL)
+    async def flush_experience(self):
+        '''Periodically write buffered experience grants'''
+        try:
+            await experience_buffer.flush()
+        except Exception as error:
+            # Failed grants are buffered again, a raise would stop the loop for good
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Could not flush experience grants: {error!r}")
+
+    @flush_experience.after_loop
+    async def after_flush_experience(self):
+        '''Flush whatever is left on cog unload or bot shutdown'''
+        await experience_buffer.flush()
+
+    async def grant_experience(self, context):
+        '''Message pipeline stage granting experience'''
+
+        message = context.message
+        # Check if channel is excluded from experience gain
+        if message.channel.id in context.server['channels']['ignore_exp']:
             return
 
-        # Look for total current experience and last experience gain in db.
-        try:
-            user_server_info = db['Users'].find_one(
-                {'_id': message.author.id})['servers'][str(message.guild.id)]
-            experience = user_server_info['experience']
-            last_experience_gain = user_server_info['last_experience_gain']
-        except KeyError:
-            experience = 0
-            last_experience_gain = EPOCH
-        else:
-            # If last gain was less than 60 seconds ago then abort.
-            if (datetime.utcnow() - last_experience_gain).total_seconds() < 60:
-                return
+        # If last gain was less than 60 seconds ago then abort.
+        key = (message.guild.id, message.author.id)
+        if experience_cooldowns.active(key):
+            return
+
+        # Look for total current experience and last experience gain,
+        # only the first message of a member since startup queries the db.
+        # The stored gain rebuilds the cooldown after a restart or eviction.
+        _, last_experience_gain = await experience_buffer.get(*key)
+        if experience_cooldowns.seed(key, last_experience_gain):
+            return
+
+        experience, new_experience = experience_buffer.grant(*key, DEFAULT_EXP_INCREASE)
+        experience_cooldowns.start(key)
+        if experience_buffer.full:
+            await experience_buffer.flush()
 
         # Check if user leveled up
-        old_level = exp_to_level(experience)
-        current_level = exp_to_level(experience + DEFAULT_EXP_INCREASE)
+        curve = get_level_curve(context.server)
+        old_level, current_level = curve.exp_to_levels((experience, new_experience))
         if current_level > old_level:
             await message.channel.send(f"{message.author.name} leveled up to {current_level}! Congratulations :partying_face:")
 
-            server_roles = db['Servers'].find_one({'_id': message.guild.id})['roles']
+            server_roles = context.server['roles']
             try:
                 new_level_role_id = server_roles[str(current_level)]
             except KeyError:
@@ -60,12 +82,6 @@ class LevelListenerCog(commands.Cog):
                 new_role = message.guild.get_role(new_level_role_id)
                 await message.author.add_roles(new_role)
 
-        # Update databse information
-        db['Users'].update_one({'_id': message.author.id},
-            {'$inc': {f'servers.{message.guild.id}.experience': DEFAULT_EXP_INCREASE},
-             '$set': {f'servers.{message.guild.id}.last_experience_gain': datetime.utcnow()}}
-        )
-
 
 def setup(bot):
     bot.add_cog(LevelListenerCog(bot))
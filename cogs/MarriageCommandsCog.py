@@ -3,6 +3,7 @@ import discord
 from discord.ext import commands
 import re
 from utils.database import db
+from utils.members import Compatibility, get_member, member_filter
 from utils.menu import Menu
 from utils.page import Page
 
@@ -14,13 +15,13 @@ class MarriageCommandsCog(commands.Cog):
     @commands.command()
     @commands.guild_only()
     async def marriage(self, ctx):
-        user = db['Users'].find_one({'_id': ctx.author.id})
+        member = await get_member(ctx.guild.id, ctx.author.id)
         try:
-            married_to = user['servers'][str(ctx.guild.id)]['married_to']
-        except KeyError:
+            married_to = member['married_to']
+        except (KeyError, TypeError):
             await ctx.send("You are not married to anyone.")
         else:
-            marriage_date = user['servers'][str(ctx.guild.id)]['marriage_date']
+            marriage_date = member['marriage_date']
             days_married = int((datetime.utcnow() - marriage_date).total_seconds()/(3600*24))
             await ctx.send(f"You have been married to <@{married_to}> for {days_married} days! :heart:")
 
@@ -28,15 +29,13 @@ class MarriageCommandsCog(commands.Cog):
     @commands.guild_only()
     async def propose(self, ctx, member: discord.Member):
         try:
-            is_proposer_married = db['Users'].find_one(
-                {'_id': ctx.author.id})['servers'][str(ctx.guild.id)]['married_to']
-        except KeyError:
+            is_proposer_married = (await get_member(ctx.guild.id, ctx.author.id))['married_to']
+        except (KeyError, TypeError):
             is_proposer_married = False
 
         try:
-            is_proposed_married = db['Users'].find_one(
-                {'_id': member.id})['servers'][str(ctx.guild.id)]['married_to']
-        except KeyError:
+            is_proposed_married = (await get_member(ctx.guild.id, member.id))['married_to']
+        except (KeyError, TypeError):
             is_proposed_married = False
 
         if is_proposer_married or is_proposed_married:
@@ -83,19 +82,19 @@ class MarriageCommandsCog(commands.Cog):
             await ctx.send("Ouch that must sting... :broken_heart:")
         else:
             date = datetime.utcnow()
-            db['Users'].update_one({'_id': ctx.author.id},
+            await db['Members'].update_one(member_filter(ctx.guild.id, ctx.author.id),
                 {'$set': {
-                    f'servers.{ctx.guild.id}.married_to': member.id,
-                    f'servers.{ctx.guild.id}.marriage_date': date
+                    'married_to': member.id,
+                    'marriage_date': date
                     }
-                }
+                }, upsert=True
             )
-            db['Users'].update_one({'_id': member.id},
+            await db['Members'].update_one(member_filter(ctx.guild.id, member.id),
                 {'$set': {
-                    f'servers.{ctx.guild.id}.married_to': ctx.author.id,
-                    f'servers.{ctx.guild.id}.marriage_date': date
+                    'married_to': ctx.author.id,
+                    'marriage_date': date
                     }
-                }
+                }, upsert=True
             )
             await ctx.send(f"Congratulations {member.name} & {ctx.author.name} are officially married! :heart:")
 
@@ -103,9 +102,8 @@ class MarriageCommandsCog(commands.Cog):
     @commands.guild_only()
     async def divorce(self, ctx):
         try:
-            married_to = db['Users'].find_one(
-                {'_id': ctx.author.id})['servers'][str(ctx.guild.id)]['married_to']
-        except KeyError:
+            married_to = (await get_member(ctx.guild.id, ctx.author.id))['married_to']
+        except (KeyError, TypeError):
             married_to = None
 
         if not married_to:
@@ -149,10 +147,14 @@ class MarriageCommandsCog(commands.Cog):
         if answer == "no":
             return
         else:
-            db['Users'].update_many({'_id': {'$in': [ctx.author.id, married_to]}},
+            # Unsetting must not race a later merge of legacy data
+            if Compatibility.enabled:
+                await get_member(ctx.guild.id, married_to)
+            await db['Members'].update_many(
+                {'guild_id': ctx.guild.id, 'user_id': {'$in': [ctx.author.id, married_to]}},
                 {'$unset': {
-                    f'servers.{ctx.guild.id}.married_to': "",
-                    f'servers.{ctx.guild.id}.marriage_date': ""
+                    'married_to': "",
+                    'marriage_date': ""
                     }
                 }
             )
@@ -0,0 +1,18 @@
+import discord
+from discord.ext import commands
+from utils.pipeline import message_pipeline
+
+
+class MessageListenersCog(commands.Cog):
+    def __init__(self, bot):
+        self.bot = bot
+
+    @commands.Cog.listener()
+    async def on_message(self, message):
+        '''Run the moderation, counting and experience stages'''
+
+        await message_pipeline.run(message)
+
+
+def setup(bot):
+    bot.add_cog(MessageListenersCog(bot))
@@ -4,8 +4,12 @@ import discord
 from discord.ext import commands
 from package_tools import _warn
 import pymongo
+from utils.cache import server_cache
 from utils.constants import EPOCH, FMT
 from utils.database import db
+from utils.members import get_member, member_filter
+from utils.mutes import mute_scheduler
+from utils.wordfilter import banned_word_matchers
 
 
 class ModeratorCommandsCog(commands.Cog):
@@ -65,20 +69,21 @@ class ModeratorCommandsCog(commands.Cog):
         else:
             dt_target_mute = datetime.utcnow() + timedelta(seconds=total_seconds)
 
-        user = db['Users'].find_one({'_id': member.id})
+        membership = await get_member(ctx.guild.id, member.id)
         try:
-            dt_current_mute = user['Servers'][str(ctx.guild.id)]['muted_until']
-        except KeyError:
+            dt_current_mute = membership['muted_until']
+        except (KeyError, TypeError):
             dt_current_mute = EPOCH
 
         if dt_current_mute > dt_target_mute:
             await ctx.send(f"{member} is already muted until {dt_current_mute.strftime(FMT)}")
             return
 
-        db['Users'].update_one({'_id': member.id},
-            {'$set': {f'servers.{ctx.guild.id}.muted_until': dt_target_mute}})
+        await db['Members'].update_one(member_filter(ctx.guild.id, member.id),
+            {'$set': {'muted_until': dt_target_mute}}, upsert=True)
+        mute_scheduler.schedule(ctx.guild.id, member.id, dt_target_mute)
 
-        server = db['Servers'].find_one({'_id': ctx.guild.id})
+        server = await db['Servers'].find_one({'_id': ctx.guild.id})
         try:
             muted_role_id = server['roles']['muted']
         except KeyError:
@@ -93,10 +98,14 @@ class ModeratorCommandsCog(commands.Cog):
     @commands.has_permissions(mute_members=True)
     async def unmute(self, ctx, member: discord.Member):
         '''Remove a user's current mute'''
-        db['Users'].update_one({'_id': member.id},
-            {'$unset': {f'servers.{ctx.guild.id}.muted_until': ''}})
 
-        server = db['Servers'].find_one({'_id': ctx.guild.id})
+        # Reading first merges any legacy mute, so it cannot come back later
+        await get_member(ctx.guild.id, member.id)
+        await db['Members'].update_one(member_filter(ctx.guild.id, member.id),
+            {'$unset': {'muted_until': ''}})
+        mute_scheduler.cancel(ctx.guild.id, member.id)
+
+        server = await db['Servers'].find_one({'_id': ctx.guild.id})
         try:
             muted_role_id = server['roles']['muted']
         except KeyError:
@@ -122,14 +131,13 @@ class ModeratorCommandsCog(commands.Cog):
     async def unwarn(self, ctx, member: discord.Member, amount: int=1):
         '''Remove `amount` warnings from user'''
 
-        current_warnings_count = db['Users'].find_one(
-        {'_id': member.id})['servers'][str(ctx.guild.id)]['warnings']
+        current_warnings_count = (await get_member(ctx.guild.id, member.id))['warnings']
 
         if amount > current_warnings_count:
             amount = current_warnings_count
 
-        db['Users'].update_one({'_id': member.id},
-        {'$inc': {f'servers.{ctx.guild.id}.warnings': -amount}})
+        await db['Members'].update_one(member_filter(ctx.guild.id, member.id),
+        {'$inc': {'warnings': -amount}})
 
         await ctx.send(f"{member.name} now has {current_warnings_count-amount} of warnings left.")
 
@@ -139,8 +147,10 @@ class ModeratorCommandsCog(commands.Cog):
     async def ban_word(self, ctx, word: str):
         '''Add a word to the list of banned_words'''
 
-        db['Servers'].update_one({'_id': ctx.guild.id},
+        await db['Servers'].update_one({'_id': ctx.guild.id},
             {'$addToSet': {'banned_words': word.strip().lower()}})
+        server_cache.invalidate(ctx.guild.id)
+        banned_word_matchers.invalidate(ctx.guild.id)
         msg = await ctx.send(f"Word ||{word}|| has been added to the ban list.")
         await asyncio.sleep(5)
         await msg.delete()
@@ -152,7 +162,7 @@ class ModeratorCommandsCog(commands.Cog):
     async def show_banned_words(self, ctx):
         '''Show an array of all the banned words'''
 
-        await ctx.send(db['Servers'].find_one({'_id': ctx.guild.id})["banned_words"])
+        await ctx.send((await db['Servers'].find_one({'_id': ctx.guild.id}))["banned_words"])
 
 def setup(bot):
     bot.add_cog(ModeratorCommandsCog(bot))
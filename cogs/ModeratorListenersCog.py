@@ -1,41 +1,46 @@
 from datetime import datetime
 import discord
 from discord.ext import commands
-import emoji
+import io
 from package_tools import _warn
 import re
+from utils.auditlog import audit_log_tracker
+from utils.cache import server_cache
 from utils.constants import FMT
-from utils.database import db
+from utils.logsink import log_sink
+from utils.pipeline import message_pipeline
+from utils.transcripts import build_transcript, retain_transcript
+from utils.wordfilter import banned_word_matchers
 
 
 class ModeratorListenersCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        message_pipeline.register('moderation', 10, self.moderate)
 
-    @commands.Cog.listener()
-    async def on_message(self, message):
-        '''Illegal message handler'''
+    def cog_unload(self):
+        message_pipeline.unregister('moderation')
+        self.bot.loop.create_task(log_sink.flush_all())
 
-        # Check if:
-        #   - Message in guild TextChannel
-        #   - Message not by bot
-        #   - Message is command to ban word
-        if (
-            not isinstance(message.channel, discord.TextChannel) or
-            message.author.bot or
-            re.match('^.ban_word .*', message.content)
-        ):
-            return
+    async def moderate(self, context):
+        '''Message pipeline stage handling illegal messages'''
 
-        # Retrieve list of banned words from database
-        banned_words = db['Servers'].find_one({'_id': message.guild.id})['banned_words']
+        # Check if message is command to ban word
+        message = context.message
+        if re.match('^.ban_word .*', message.content):
+            return
 
-        # Search for word in text
-        for word in banned_words:
-            if re.search(word, message.content.replace(" ", ""), re.IGNORECASE):
-                reason = f"Use of banned word(s): ||{word}||"
-                await _warn(message.author, message.guild, reason)
-                await message.delete()
+        # Search for all banned words in a single scan of the text
+        matcher = banned_word_matchers.get(message.guild.id, context.server['banned_words'])
+        if not matcher:
+            return
+        hits = matcher.find(message.content.replace(" ", ""))
+        if hits:
+            reason = f"Use of banned word(s): ||{', '.join(hits)}||"
+            await _warn(message.author, message.guild, reason)
+            await message.delete()
+            # Deleted messages should not count or earn experience
+            context.stop(reason)
 
     @commands.Cog.listener()
     async def on_raw_message_delete(self, payload):
@@ -44,14 +49,11 @@ class ModeratorListenersCog(commands.Cog):
         # Check if message in a guild
         if not payload.guild_id: return
 
-        # Retrieve log channel id and get channel object
-        server = db['Servers'].find_one({'_id': payload.guild_id})
-        try:
-            log_channel_id = server['channels']['log']
-        except KeyError:
+        # Check if guild has a log channel
+        server = await server_cache.get(payload.guild_id)
+        if not server or 'log' not in server['channels']:
             return
-        else:
-            log_channel = self.bot.get_channel(log_channel_id)
+        guild = self.bot.get_guild(payload.guild_id)
 
         if not payload.cached_message:
             embed = discord.Embed(
@@ -59,7 +61,7 @@ class ModeratorListenersCog(commands.Cog):
                 description=f"Message with id {payload.message_id} in channel <#{payload.channel_id}>.",
                 colour=discord.Colour.red()
             )
-            await log_channel.send(embed=embed)
+            log_sink.log(guild, embed)
             return
 
         if (
@@ -85,7 +87,7 @@ class ModeratorListenersCog(commands.Cog):
         elif message.content:
             embed.add_field(name="**Content: **", value=f"{message.content}", inline=False)
 
-        await log_channel.send(embed=embed)
+        log_sink.log(guild, embed)
 
     @commands.Cog.listener()
     async def on_raw_message_edit(self, payload):
@@ -98,14 +100,10 @@ class ModeratorListenersCog(commands.Cog):
         except KeyError:
             return
 
-        server = db['Servers'].find_one({'_id': guild_id})
-        try:
-            log_channel_id = server['channels']['log']
-        except KeyError:
+        # Check if guild has a log channel
+        server = await server_cache.get(guild_id)
+        if not server or 'log' not in server['channels']:
             return
-        else:
-            log_channel = self.bot.get_channel(log_channel_id)
-
 
         # Get necessary information from Discord Api
         guild = self.bot.get_guild(guild_id)
@@ -124,7 +122,7 @@ class ModeratorListenersCog(commands.Cog):
                 colour=discord.Colour.orange()
             )
             embed.add_field(name="Content", value=message_after.content)
-            await log_channel.send(embed=embed)
+            log_sink.log(guild, embed)
             return
 
         message_before = payload.cached_message
@@ -161,7 +159,7 @@ class ModeratorListenersCog(commands.Cog):
         embed.add_field(name="**Before: **", value=f"{message_before.content}", inline=False)
         embed.add_field(name="**After: **", value=f"{message_after.content}", inline=False)
 
-        await log_channel.send(embed=embed)
+        log_sink.log(guild, embed)
 
     @commands.Cog.listener()
     async def on_bulk_message_delete(self, messages):
@@ -171,44 +169,18 @@ class ModeratorListenersCog(commands.Cog):
         guild_id = messages[-1].guild.id
         deleter, channel = messages[-1].author, messages[-1].channel
 
-        # Get log channel from database
-        server = db['Servers'].find_one({'_id': guild_id})
+        # Get log channel
+        server = await server_cache.get(guild_id)
         try:
-            log_channel_id = server['channels']['log']
-        except KeyError:
+            log_channel = messages[-1].guild.get_channel(server['channels']['log'])
+        except (KeyError, TypeError):
             return
-        else:
-            log_channel = self.bot.get_channel(log_channel_id)
-
-        # Reformat and write messages to text file
-        with open(f"bulk_delete_logs/{guild_id}.txt", 'w') as f:
-            print(
-                f"Bulk delete by {deleter.name}:{deleter.id} at",
-                f"{datetime.utcnow().strftime(FMT)}",
-                end="\n\n", file=f
-            )
-            for message in messages:
-                # Filter emoji's
-                message.content = emoji.demojize(message.content)
-
-                # Remove 'Zero Width Space' unicodes
-                message.content = re.sub('U200B', 'ZWS', message.content)
-
-                # Add attachment url if necessary
-                if not message.content and message.attachments:
-                    message.content = f"Attachment[{message.attachments[0].url}]"
-                elif message.content and message.attachments:
-                    message.content += f" | Attachment[{message.attachments[0].url}]"
-
-                try:
-                    print(
-                        f"[{message.created_at.strftime(FMT)}]",
-                        f"| By: {message.author}:{message.author.id}",
-                        f"| In: {channel.id} | Containing: {message.content}",
-                        end="\n\n", file=f
-                    )
-                except UnicodeEncodeError:
-                    pass
+        if not log_channel:
+            return
+
+        # Build the gzipped transcript in memory, split to fit the upload limit
+        parts = await build_transcript(messages, deleter, messages[-1].guild.filesize_limit)
+        await retain_transcript(guild_id, channel.id, deleter.id, parts)
 
         # Setting up log message embed
         embed = discord.Embed(
@@ -216,26 +188,23 @@ class ModeratorListenersCog(commands.Cog):
             description=f"Purge action performed in channel: {channel.mention}",
             colour=discord.Colour.purple()
         )
-        embed.add_field(name="Content: ", value="See attached txt file!")
+        embed.add_field(name="Content: ", value="See attached txt.gz file!")
         await log_channel.send(embed=embed)
 
-        # Sending log file
-        with open(f"bulk_delete_logs/{guild_id}.txt", 'rb') as f:
-            file_name = f"[{datetime.utcnow().strftime(FMT)}]_bulk_delete.txt"
-            await log_channel.send(file=discord.File(f, file_name))
+        # Sending transcript
+        file_name = f"[{datetime.utcnow().strftime(FMT)}]_bulk_delete"
+        for index, part in enumerate(parts, start=1):
+            suffix = f"_{index}" if len(parts) > 1 else ""
+            await log_channel.send(file=discord.File(io.BytesIO(part), f"{file_name}{suffix}.txt.gz"))
 
     @commands.Cog.listener()
     async def on_member_remove(self, member):
         '''Logging of kicks and bans'''
 
-        # Get last audit log entry and check if seconds gone by since entry
-        # is lower than 2.5
-        # This could perform poorly when either guild or bot are
-        # under heavy loads.
-        async for entry in member.guild.audit_logs(limit=1):
-            act = entry
-            if (datetime.utcnow()-entry.created_at).total_seconds() > 2.5:
-                return
+        # Find the kick or ban entry targeting this member, if any
+        act = await audit_log_tracker.find(member.guild, member.id)
+        if not act:
+            return
 
         # Get performed action (kick or ban)
         if str(act.action) == "AuditLogAction.kick":
@@ -245,15 +214,6 @@ class ModeratorListenersCog(commands.Cog):
         else:
             return
 
-        # Get log channel from database
-        server = db['Servers'].find_one({'_id': member.guild.id})
-        try:
-            log_channel_id = server['channels']['log']
-        except KeyError:
-            return
-        else:
-            log_channel = self.bot.get_channel(log_channel_id)
-
         # Setting up log message embed
         embed = discord.Embed(
             title=f"Member {member.name}:{member.id} was {action}!",
@@ -266,7 +226,7 @@ class ModeratorListenersCog(commands.Cog):
             act.reason = 'No reason given.'
         embed.add_field(name="Reason: ", value=act.reason)
 
-        await log_channel.send(embed=embed)
+        log_sink.log(member.guild, embed)
 
 
 def setup(bot):
@@ -1,7 +1,9 @@
 import discord
 from discord.ext import commands
-from utils.constants import NUMBER_EMOTES_DISCORD, NUMBER_EMOTES_UNICODE, TOTAL_BARS
+from utils.cache import server_cache
+from utils.constants import NUMBER_EMOTES_UNICODE
 from utils.database import db
+from utils.polls import poll_embed, poll_votes
 
 
 class PollCommandsCog(commands.Cog):
@@ -52,14 +54,7 @@ class PollCommandsCog(commands.Cog):
             await ctx.send("Maximum poll queries reached!")
 
         # Setup embed for poll message
-        embed = discord.Embed(title=f":bar_chart: {poll.content}")
-
-        for ind, query in enumerate(queries):
-            embed.add_field(
-            name=f"{NUMBER_EMOTES_DISCORD[ind+1]} {query}",
-            value=f"`{' '*TOTAL_BARS}`| 0% (0)",
-            inline=False
-            )
+        embed = poll_embed(poll.content, queries, [0]*len(queries))
 
         # Remove operation messages
         await ctx.channel.purge(limit=4+len(queries))
@@ -71,14 +66,32 @@ class PollCommandsCog(commands.Cog):
             await poll_message.add_reaction(NUMBER_EMOTES_UNICODE[i])
 
         # Save data in database
-        db['Servers'].update_one({'_id': ctx.guild.id},
+        await db['Servers'].update_one({'_id': ctx.guild.id},
             {'$set': {
                 f'polls.{poll_message.id}.channel': ctx.channel.id,
                 f'polls.{poll_message.id}.title': poll.content,
-                f'polls.{poll_message.id}.queries': queries
+                f'polls.{poll_message.id}.queries': queries,
+                f'polls.{poll_message.id}.counts': [0]*len(queries)
                 }
             }
         )
+        server_cache.invalidate(ctx.guild.id)
+
+    @commands.command()
+    @commands.guild_only()
+    async def poll_results(self, ctx, message_id: int):
+        '''Show the results of a poll from the recorded votes'''
+
+        server = await server_cache.get(ctx.guild.id)
+        try:
+            info = server['polls'][str(message_id)]
+        except (KeyError, TypeError):
+            await ctx.send("That message is not a poll!")
+            return
+
+        counts = await poll_votes.results(message_id, len(info['queries']))
+        await ctx.send(embed=poll_embed(info['title'], info['queries'],
+                                        counts or [0]*len(info['queries'])))
 
 
 def setup(bot):
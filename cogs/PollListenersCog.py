@@ -1,71 +1,91 @@
+from datetime import datetime
 import discord
-from discord.ext import commands
-import math
-from utils.constants import NUMBER_EMOTES_DISCORD, TOTAL_BARS
+from discord.ext import commands, tasks
+from utils.constants import FMT, POLL_FLUSH_INTERVAL
 from utils.database import db
+from utils.polls import poll_store
 
 
 class PollListenersCog(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self.flush_polls.start()
+        self.reconciling = bot.loop.create_task(self.reconcile_polls())
 
-    async def update_poll(self, payload):
+    def cog_unload(self):
+        self.reconciling.cancel()
+        # Cancelling runs the after_loop hook, which renders and writes what is left
+        self.flush_polls.cancel()
+
+    @tasks.loop(seconds=POLL_FLUSH_INTERVAL)
+    async def flush_polls(self):
+        '''Periodically write changed poll counts'''
+        try:
+            await poll_store.flush()
+        except Exception as error:
+            # Unwritten counts stay dirty, a raise would stop the loop for good
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Could not flush poll counts: {error!r}")
+
+    @flush_polls.after_loop
+    async def after_flush_polls(self):
+        '''Render and write whatever is left on cog unload or bot shutdown'''
+        await poll_store.close()
+
+    async def reconcile_polls(self):
+        '''Rebuild the votes of all polls from reactions missed while offline'''
+
+        await self.bot.wait_until_ready()
+        polls = 0
+        async for server in db['Servers'].find({'polls': {'$ne': {}}}, {'polls': 1}):
+            guild = self.bot.get_guild(server['_id'])
+            if not guild:
+                continue
+            for message_id, info in server['polls'].items():
+                try:
+                    await poll_store.reconcile(guild, int(message_id), info)
+                except discord.HTTPException as error:
+                    print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                          f"Could not reconcile poll {message_id}: {error}")
+                else:
+                    polls += 1
+        print(f"[{datetime.utcnow().strftime(FMT)}]\t Reconciled votes of {polls} polls")
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        '''New gateway session, reactions may have been missed meanwhile'''
+
+        if self.reconciling.done():
+            self.reconciling = self.bot.loop.create_task(self.reconcile_polls())
+
+    async def update_poll(self, payload, add: bool):
         '''
-        Update poll message based on reactions
+        Count a vote on a poll message, the message itself is edited
+        at most once per render interval with the latest counts.
         Invoked on on_raw_reaction_add or on_raw_reaction_remove
         '''
 
-        # Get query data from database
-        server = db['Servers'].find_one({'_id': payload.guild_id})
-        try:
-            info = server['polls'][str(payload.message_id)]
-        except KeyError:
-            return  # Message not a poll
+        if payload.user_id == self.bot.user.id:
+            return  # Reactions added by the bot are not votes
 
-        # Retrieve necessary information from Discord Api
         guild = self.bot.get_guild(payload.guild_id)
-        channel = guild.get_channel(payload.channel_id)
-        message = await channel.fetch_message(payload.message_id)
-
-        embed = discord.Embed(title=f":bar_chart: {info['title']}")
-        # Get fraction of reactions for every query
-        total_reactions = sum([(reaction.count-1) for reaction in message.reactions])
-        for ind, reaction in enumerate(message.reactions):
-            if total_reactions == 0:
-                fraction = 0
-            else:
-                fraction = (reaction.count-1)/total_reactions
-
-
-            emote = NUMBER_EMOTES_DISCORD[ind+1]
-            query = info['queries'][ind]
-            bars = '█'*math.ceil(fraction*TOTAL_BARS)
-            empty = ' '*(math.ceil((1-fraction)*TOTAL_BARS))
-            percentage = round(fraction*100, 2)
-            total = reaction.count - 1
-
-            # Add embedded field depending on the fraction
-            embed.add_field(
-                name=f"{emote} {query}",
-                value=f"`{bars}{empty}`| {percentage}% ({total})",
-                inline=False
-            )
-
-        await message.edit(embed=embed)
+        if not guild:
+            return
+        await poll_store.react(guild, payload, add)
 
     @commands.Cog.listener()
     async def on_raw_reaction_add(self, payload):
         '''Poll update function on added reaction'''
 
         if payload.guild_id:
-            await self.update_poll(payload)
+            await self.update_poll(payload, True)
 
     @commands.Cog.listener()
     async def on_raw_reaction_remove(self, payload):
         '''Poll update function on removed reaction'''
 
         if payload.guild_id:
-            await self.update_poll(payload)
+            await self.update_poll(payload, False)
 
     # @commands.Cog.listener()
     # async def on_raw_message_delete(self, payload):  # Put into batch updater?
@@ -2,6 +2,7 @@ import asyncio
 import discord
 from discord.ext import commands
 import re
+from utils.cache import server_cache
 from utils.database import db
 from utils.menu import Menu
 from utils.page import Page, EmbeddedPage
@@ -20,7 +21,7 @@ class RoleManagerCommandsCog(commands.Cog):
     @commands.guild_only()
     @commands.has_permissions(administrator=True)
     async def re_manage(self, ctx, manager_id: int):
-        server = db['Servers'].find_one({'_id': ctx.guild.id})
+        server = await db['Servers'].find_one({'_id': ctx.guild.id})
         try:
             roles = server['role_managers'][str(manager_id)]['roles']
             channel_id = server['role_managers'][str(manager_id)]['channel']
@@ -188,8 +189,9 @@ class RoleManagerCommandsCog(commands.Cog):
         await menu.stop()
         await ctx.channel.purge(limit=len(role_manager['roles'].keys())+1)
         # Updating database information
-        db['Servers'].update_one({'_id': ctx.guild.id},
+        await db['Servers'].update_one({'_id': ctx.guild.id},
         {'$set': {f'role_managers.{str(manager_message.id)}': role_manager}})
+        server_cache.invalidate(ctx.guild.id)
 
         end_message = await ctx.send("Everything is setup! You may delete anything unnecessary :)")
         await ctx.message.delete()
@@ -13,7 +13,7 @@ class RoleManagerListenersCog(commands.Cog):
         if not payload.guild_id:
             return
 
-        server = db['Servers'].find_one({'_id': payload.guild_id})
+        server = await db['Servers'].find_one({'_id': payload.guild_id})
         try:
             manager = server['role_managers'][str(payload.message_id)]
         except KeyError:
@@ -47,7 +47,7 @@ class RoleManagerListenersCog(commands.Cog):
         if not payload.guild_id:
             return
 
-        server = db['Servers'].find_one({'_id': payload.guild_id})
+        server = await db['Servers'].find_one({'_id': payload.guild_id})
         try:  # Check if message a role manager
             manager = server['role_managers'][str(payload.message_id)]
         except KeyError:
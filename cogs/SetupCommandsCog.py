@@ -4,9 +4,11 @@ from discord.ext import commands
 from package_tools import _leave, _purge, _setup
 import pymongo
 import re
+from utils.cache import server_cache
 from utils.constants import DEFAULT_CHANNELS, NUMBER_EMOTES_DISCORD, NUMBER_EMOTES_UNICODE
 from utils.database import db
 from utils.menu import Menu
+from utils.migrations import migrate_memberships
 from utils.page import Page, EmbeddedPage
 
 
@@ -34,6 +36,16 @@ class SetupCommandsCog(commands.Cog):
         '''Makes bot leave server and deletes all saved information!!!'''
         await _leave(ctx.guild)
 
+    # Owner commands
+    @commands.command()
+    @commands.is_owner()
+    async def migrate_members(self, ctx):
+        '''Move all memberships from the legacy user layout to Members'''
+
+        await ctx.send("Migrating memberships, the bot stays online meanwhile...")
+        migrated = await migrate_memberships()
+        await ctx.send(f"Membership migration complete, {migrated} memberships migrated.")
+
     @commands.command()
     @commands.guild_only()
     @commands.has_permissions(administrator=True)
@@ -44,7 +56,8 @@ class SetupCommandsCog(commands.Cog):
             await ctx.send("The prefix may not be longer than 5 characters.")
             return
 
-        db['Servers'].update_one({'_id': ctx.guild.id}, {'$set': {'prefix': prefix}})
+        await db['Servers'].update_one({'_id': ctx.guild.id}, {'$set': {'prefix': prefix}})
+        server_cache.invalidate(ctx.guild.id)
         await ctx.send(f"Your prefix has been changed to {prefix}")
 
     @commands.command()
@@ -103,8 +116,9 @@ class SetupCommandsCog(commands.Cog):
         input, _ = input_tuple
         channel_id = int(re.sub('[<#>]', '', input.content))
 
-        db['Servers'].update_one({'_id': ctx.guild.id},
+        await db['Servers'].update_one({'_id': ctx.guild.id},
             {'$set': {f'channels.{channel_type}': channel_id}})
+        server_cache.invalidate(ctx.guild.id)
         await menu.stop()
         await ctx.send(f"<#{channel_id}> has been setup as the {channel_type} channel!")
 
@@ -6,6 +6,8 @@ from package_tools import add_user_to_database, _leave, _setup
 import pymongo
 from utils.constants import DEFAULT_CHANNELS, DEFAULT_ROLES, FMT, FMT_DATE
 from utils.database import db, DEFAULT_SERVER, DEFAULT_USER
+from utils.guildindex import index_guild, member_guilds
+from utils.members import departure, expire_disconnected_users, member_filter
 
 
 class SetupListenersCog(commands.Cog):
@@ -16,20 +18,29 @@ class SetupListenersCog(commands.Cog):
     async def on_guild_join(self, guild):
         '''Bot joins guild handler'''
 
+        await index_guild(guild)
         await _setup(guild)
 
+    @commands.Cog.listener()
+    async def on_guild_available(self, guild):
+        '''Guild (re)appears in the gateway cache handler'''
+
+        member_guilds.add_guild(guild)
+
     @commands.Cog.listener()
     async def on_guild_remove(self, guild):
         '''Bot removed from guild handler'''
 
+        member_guilds.remove_guild(guild)
         await _leave(guild)
 
     @commands.Cog.listener()
     async def on_member_join(self, member):
         '''Member joins guild of bot handler'''
 
-        add_user_to_database(member)
-        server = db['Servers'].find_one({'_id': member.guild.id})
+        member_guilds.add(member.id, member.guild.id)
+        await add_user_to_database(member)
+        server = await db['Servers'].find_one({'_id': member.guild.id})
         try:
             spawn_channel_id = server['channels']['spawn']
         except KeyError:
@@ -52,21 +63,17 @@ class SetupListenersCog(commands.Cog):
         '''Member leaves guild of bot handler'''
 
         guild = member.guild
+        member_guilds.remove(member.id, guild.id)
+
         # Set member leave date
-        try:
-            db['Users'].update_one({'_id': member.id},
-            {'$set': {f'servers.{guild.id}.leave_date': datetime.utcnow()}})
-        except KeyError:
-            print(f"[{datetime.utcnow().strftime(FMT)}]\t ",
-            f"Member {member.id} was removed from {guild.name}:{guild.id} ",
-            "but server information for user was never stored.")
-        except AttributeError:
-            print(f"[{datetime.utcnow().strftime(FMT)}]\t ",
-            f"Member {member.id} was removed from {guild.name}:{guild.id} ",
-            "but user information was never stored.")
+        if not member.bot:
+            now = datetime.utcnow()
+            await db['Members'].update_one(member_filter(guild.id, member.id),
+                {'$set': departure(now)}, upsert=True)
+            await expire_disconnected_users([member.id], now)
 
         # Get eject channel
-        server = db['Servers'].find_one({'_id': guild.id})
+        server = await db['Servers'].find_one({'_id': guild.id})
         try:
             eject_channel_id = server['channels']['eject']
         except KeyError:
@@ -1,5 +1,6 @@
 import discord
 from discord.ext import commands
+from utils.cache import server_cache
 from utils.constants import DEFAULT_MANAGERS
 from utils.database import db
 
@@ -16,13 +17,14 @@ class UpdateListenersCog(commands.Cog):
         if not guild_id:
             return
         message_id = payload.message_id
-        server = db['Servers'].find_one({'_id': int(guild_id)})
+        server = await db['Servers'].find_one({'_id': int(guild_id)})
         deleted_message_type = None
         for manager in DEFAULT_MANAGERS:
             if str(message_id) in server[manager].keys():
                 deleted_message_type = manager
-                db['Servers'].update_one({'_id': guild_id},
+                await db['Servers'].update_one({'_id': guild_id},
                     {'$unset': {f'{manager}.{message_id}': ''}})
+                server_cache.invalidate(guild_id)
 
 
         if not deleted_message_type:
@@ -51,11 +53,12 @@ class UpdateListenersCog(commands.Cog):
 
         guild = deleted_channel.guild
 
-        server = db['Servers'].find_one({'_id': guild.id})
+        server = await db['Servers'].find_one({'_id': guild.id})
         for name, id in server['channels'].items():
             if deleted_channel.id == id:
-                db['Servers'].update_one({'_id': guild.id},
+                await db['Servers'].update_one({'_id': guild.id},
                     {'$unset': {f'channels.{name}': ''}})
+                server_cache.invalidate(guild.id)
                 break
         else:
             return
@@ -84,15 +87,16 @@ class UpdateListenersCog(commands.Cog):
         send a log update of this happening.
         '''
         guild = deleted_role.guild
-        server = db['Servers'].find_one({'_id': guild.id})
+        server = await db['Servers'].find_one({'_id': guild.id})
 
         log = False
         for role, role_id in server['roles'].items():
             if role_id == deleted_role.id:
                 log = (role, role_id)
-                db['Servers'].update_one({'_id': guild.id}, {
+                await db['Servers'].update_one({'_id': guild.id}, {
                     '$unset': {f'roles.{role}': ''}
                 })
+                server_cache.invalidate(guild.id)
 
         if not log:
             return
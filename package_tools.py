@@ -1,5 +1,6 @@
 import asyncio
 import collections
+import copy
 import discord
 from discord.ext import commands
 from datetime import datetime
@@ -8,22 +9,22 @@ import math
 import pymongo
 import re
 from typing import Union
-from utils.database import db, DEFAULT_SERVER, DEFAULT_USER
-from utils.constants import DEFAULT_CHANNELS, DEFAULT_ROLES, FMT, MAX_LEVEL, NUMBER_EMOTES_DISCORD, TOTAL_BARS
+from utils.cache import server_cache
+from utils.database import db, DEFAULT_SERVER
+from utils.guildindex import member_guilds
+from utils.constants import DEFAULT_CHANNELS, DEFAULT_ROLES, FMT, NUMBER_EMOTES_DISCORD, TOTAL_BARS
+from utils.counting import counting_store
+from utils.levels import get_level_curve
+from utils.members import ARRIVAL, Compatibility, expire_disconnected_users, get_member, member_filter
 
 
 
-def level_to_exp(level: int) -> int:
-    return 1000 * sum(range(level+1))
+def level_to_exp(level: int, server: dict=None) -> int:
+    return get_level_curve(server).level_to_exp(level)
 
 
-def exp_to_level(exp: int) -> int:
-    total = 0
-    for i in range(MAX_LEVEL):
-        total += i
-        if total * 1000 > exp:
-            return i - 1
-    return MAX_LEVEL
+def exp_to_level(exp: int, server: dict=None) -> int:
+    return get_level_curve(server).exp_to_level(exp)
 
 
 def get_emoji_number(number: int) -> str:
@@ -51,7 +52,7 @@ def get_emoji_number(number: int) -> str:
     return emoji_number
 
 
-def add_user_to_database(member: discord.Member):
+async def add_user_to_database(member: discord.Member):
     '''
     Setup configuration settings for new member,
     bundle and store data in database.
@@ -66,26 +67,16 @@ def add_user_to_database(member: discord.Member):
         return
 
     guild = member.guild
-    user = db['Users'].find_one({'_id': member.id})
-    if not user:
-        user = DEFAULT_USER
-        user['_id'] = member.id
+    await db['Users'].update_one({'_id': member.id},
+        {'$unset': ARRIVAL}, upsert=True)
 
-    try:
-        server = user['servers'][str(guild.id)]
-    except KeyError:
-        server = {
-            'join_date': datetime.utcnow(),
-            'experience': 0
-        }
-    else:
-        try:
-            del server['leave_date']
-        except KeyError:
-            pass
-    finally:
-        db['Users'].update_one({'_id': member.id},
-            {'$set': {f'servers.{guild.id}': server}}, upsert=True)
+    # Reading first merges any legacy membership before leave_date is unset
+    if Compatibility.enabled:
+        await get_member(guild.id, member.id)
+
+    await db['Members'].update_one(member_filter(guild.id, member.id),
+        {'$setOnInsert': {'join_date': datetime.utcnow(), 'experience': 0},
+         '$unset': ARRIVAL}, upsert=True)
 
 
 async def get_shared_guilds(bot: commands.Bot, user_id: int) -> list:
@@ -106,8 +97,9 @@ async def get_shared_guilds(bot: commands.Bot, user_id: int) -> list:
     '''
 
     shared_guilds = []
-    for guild in bot.guilds:
-        if guild.get_member(user_id):
+    for guild_id in member_guilds.get(user_id):
+        guild = bot.get_guild(guild_id)
+        if guild:
             shared_guilds.append(guild)
 
     return shared_guilds
@@ -139,15 +131,14 @@ async def _warn(member: discord.Member, guild: discord.Guild, *reason: tuple):
         reason = "No reason given."
 
     # Increment total warnings count for user in guild
-    db['Users'].update_one({'_id': member.id},
-        {'$inc': {f'servers.{guild.id}.warnings': 1}})
+    await db['Members'].update_one(member_filter(guild.id, member.id),
+        {'$inc': {'warnings': 1}}, upsert=True)
 
     # Get current amount of warnings
-    current_warnings_count = db['Users'].find_one(
-        {'_id': member.id})['servers'][str(guild.id)]['warnings']
+    current_warnings_count = (await get_member(guild.id, member.id))['warnings']
 
     # Get log channel
-    server = db['Servers'].find_one({'_id': guild.id})
+    server = await db['Servers'].find_one({'_id': guild.id})
     try:
         log_channel_id = server['channels']['log']
     except KeyError:
@@ -170,9 +161,10 @@ async def _setup(guild):
     '''Setting up a guild'''
 
     # Check if bot already knows server
-    server = db['Servers'].find_one({'_id': guild.id})
+    server = await db['Servers'].find_one({'_id': guild.id})
     if not server:
-        server = DEFAULT_SERVER
+        # Copy so the cached document never aliases the module default
+        server = copy.deepcopy(DEFAULT_SERVER)
         server['_id'] = guild.id
     # Server properties setup
     # Channels
@@ -223,17 +215,24 @@ async def _setup(guild):
             pass
 
     # Adding information to database
-    db['Servers'].replace_one({'_id': guild.id}, server, upsert=True)
+    await db['Servers'].replace_one({'_id': guild.id}, server, upsert=True)
+    server_cache.set(guild.id, server)
 
 
 async def _leave(guild):
         '''Makes bot leave guild and delete it's features'''
 
-        db['Servers'].delete_one({'_id': guild.id})
+        await db['Servers'].delete_one({'_id': guild.id})
+        server_cache.invalidate(guild.id)
+        counting_store.drop(guild.id)
 
-        db['Users'].update_many({'servers': str(guild.id)},
+        user_ids = await db['Members'].distinct('user_id', {'guild_id': guild.id})
+        await db['Members'].delete_many({'guild_id': guild.id})
+        await expire_disconnected_users(user_ids)
+        await db['PollVotes'].delete_many({'guild_id': guild.id})
+        await db['Users'].update_many({f'servers.{guild.id}': {'$exists': True}},
             {'$unset':
-                {f'servers.{guild.id}'}
+                {f'servers.{guild.id}': ''}
             }
         )
 
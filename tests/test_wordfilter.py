@@ -0,0 +1,42 @@
+import unittest
+from utils.wordfilter import AhoCorasickMatcher, RegexMatcher, compile_matcher
+
+
+class RegexMatcherTest(unittest.TestCase):
+    def test_lookahead(self):
+        matcher = RegexMatcher(['foo(?=bar)', r'\bbaz\b'])
+        self.assertEqual(matcher.find("foobar baz"), ['foo(?=bar)', r'\bbaz\b'])
+        self.assertEqual(matcher.find("foobaz bazooka"), [])
+
+    def test_inline_flag(self):
+        matcher = RegexMatcher(['(?i)foo', 'bar'])
+        self.assertIsNone(matcher.pattern)
+        self.assertEqual(matcher.find("BAR then FOO"), ['bar', '(?i)foo'])
+        self.assertEqual(matcher.find("clean"), [])
+
+    def test_shared_group_name(self):
+        matcher = RegexMatcher(['(?P<w>foo)', '(?P<w>bar)'])
+        self.assertEqual(matcher.find("bar"), ['(?P<w>bar)'])
+
+    def test_overlapping(self):
+        matcher = RegexMatcher(['ab', 'abc'])
+        self.assertEqual(matcher.find("xabc"), ['ab', 'abc'])
+
+    def test_broken_pattern_is_literal(self):
+        matcher = RegexMatcher(['a(b'])
+        self.assertEqual(matcher.find("xa(by"), ['a(b'])
+
+
+class CompileMatcherTest(unittest.TestCase):
+    def test_large_plain_list_uses_automaton(self):
+        words = [f"word{i}" for i in range(200)]
+        matcher = compile_matcher(words)
+        self.assertIsInstance(matcher, AhoCorasickMatcher)
+        self.assertEqual(matcher.find("a WORD12 b word7"), ['word1', 'word12', 'word7'])
+
+    def test_empty_list(self):
+        self.assertIsNone(compile_matcher(['']))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import ast
+import functools
+import operator
+from typing import Union
+from utils.constants import ARITHMETIC_MAX_BITS, ARITHMETIC_MAX_LENGTH, ARITHMETIC_MAX_OPERATIONS
+
+
+class ExpressionError(ValueError):
+    '''Raised when an expression is invalid or exceeds the evaluation budget'''
+    pass
+
+
+_BINARY_OPERATORS = {
+    ast.Add: operator.add,
+    ast.Sub: operator.sub,
+    ast.Mult: operator.mul,
+    ast.Div: operator.truediv,
+    ast.FloorDiv: operator.floordiv,
+    ast.Mod: operator.mod,
+    ast.Pow: operator.pow
+}
+_UNARY_OPERATORS = {
+    ast.UAdd: operator.pos,
+    ast.USub: operator.neg
+}
+
+
+@functools.lru_cache(maxsize=4096)
+def parse_expression(source: str) -> ast.AST:
+    '''
+    Parse an arithmetic expression into a validated AST.
+
+    Only number literals, the binary operators + - * / // % ** and unary
+    + - are allowed. Results are cached, so repeated expressions are only
+    parsed once.
+
+    Raises:
+    -------
+        ExpressionError:
+            The expression is too long, is not valid arithmetic or has
+            more than `ARITHMETIC_MAX_OPERATIONS` operators.
+    '''
+
+    if len(source) > ARITHMETIC_MAX_LENGTH:
+        raise ExpressionError("Expression is too long.")
+
+    try:
+        tree = ast.parse(source.strip(), mode='eval').body
+    except (SyntaxError, ValueError):
+        raise ExpressionError("Expression is not valid arithmetic.")
+
+    operations = 0
+    for node in ast.walk(tree):
+        if isinstance(node, (ast.BinOp, ast.UnaryOp)):
+            operations += 1
+        elif isinstance(node, ast.Constant):
+            if type(node.value) not in (int, float):
+                raise ExpressionError("Only numbers are allowed.")
+            if isinstance(node.value, int) and node.value.bit_length() > ARITHMETIC_MAX_BITS:
+                raise ExpressionError("Number is too large.")
+        elif not isinstance(node, tuple(_BINARY_OPERATORS) + tuple(_UNARY_OPERATORS)):
+            raise ExpressionError(f"{type(node).__name__} is not allowed.")
+
+    if operations > ARITHMETIC_MAX_OPERATIONS:
+        raise ExpressionError("Expression has too many operations.")
+    return tree
+
+
+def _check_budget(op: type, left, right):
+    '''Reject integer operations whose result would exceed the bit budget'''
+
+    if not (isinstance(left, int) and isinstance(right, int)):
+        return
+
+    # Lower bounds of the result size, anything that passes is at most
+    # twice the budget and is checked exactly after computing it
+    if op is ast.Mult:
+        bits = left.bit_length() + right.bit_length() - 1
+    elif op is ast.Pow:
+        if right < 0 or abs(left) < 2:
+            return  # Result is a float or can not grow
+        bits = (left.bit_length() - 1) * right + 1
+    else:
+        return  # Other operations never grow past the operands by more than a bit
+
+    if bits > ARITHMETIC_MAX_BITS:
+        raise ExpressionError("Result would be too large.")
+
+
+def _evaluate(node: ast.AST) -> Union[int, float]:
+    if isinstance(node, ast.Constant):
+        return node.value
+
+    if isinstance(node, ast.UnaryOp):
+        return _UNARY_OPERATORS[type(node.op)](_evaluate(node.operand))
+
+    left, right = _evaluate(node.left), _evaluate(node.right)
+    op = type(node.op)
+    _check_budget(op, left, right)
+    try:
+        result = _BINARY_OPERATORS[op](left, right)
+    except (ArithmeticError, ValueError):
+        raise ExpressionError("Expression can not be evaluated.")
+
+    if isinstance(result, int) and result.bit_length() > ARITHMETIC_MAX_BITS:
+        raise ExpressionError("Result would be too large.")
+    if isinstance(result, complex):
+        raise ExpressionError("Result is not a real number.")
+    return result
+
+
+@functools.lru_cache(maxsize=4096)
+def evaluate(source: str) -> Union[int, float]:
+    '''
+    Safely evaluate an arithmetic expression within a bounded budget.
+
+    Parameters:
+    -----------
+        source: :class:`str`
+            Expression to evaluate, e.g. "(3+4)*2".
+
+    Returns:
+    --------
+        result: :class:`Union[int, float]`
+            Value of the expression.
+
+    Raises:
+    -------
+        ExpressionError:
+            The expression is invalid or over budget, this is detected
+            before any expensive arithmetic is done.
+    '''
+
+    return _evaluate(parse_expression(source))
@@ -0,0 +1,128 @@
+import asyncio
+import collections
+from datetime import datetime, timedelta
+import discord
+from utils.constants import AUDIT_LOG_DEBOUNCE, AUDIT_LOG_WINDOW
+
+
+class AuditLogTracker():
+    '''
+    Correlates member removals with the kick and ban audit log entries
+    that caused them.
+
+    Recent entries are fetched per guild, starting after the newest
+    entry seen before, and matched to removals by target id. A fetch is
+    started `debounce` seconds after the first removal that needs one,
+    all removals of the guild in the meantime share it. The delay also
+    gives Discord time to write the entry, so a member leaving on their
+    own costs a single fetch.
+
+    Attributes:
+    -----------
+        window: :class:`float`
+            Maximum age in seconds of an entry that can still be matched.
+        debounce: :class:`float`
+            Seconds removals are gathered before a fetch is started.
+        fetches: :class:`int`
+            Amount of audit log fetches made.
+        matched: :class:`int`
+            Amount of removals that were matched to an entry.
+    '''
+
+    ACTIONS = (discord.AuditLogAction.kick, discord.AuditLogAction.ban)
+
+    def __init__(self, window: float=AUDIT_LOG_WINDOW, debounce: float=AUDIT_LOG_DEBOUNCE):
+        self.window = window
+        self.debounce = debounce
+        self._entries = collections.defaultdict(dict)
+        self._last_entry = {}
+        self._batches = {}
+        self._locks = collections.defaultdict(asyncio.Lock)
+
+        self.fetches = 0
+        self.matched = 0
+
+    async def find(self, guild: discord.Guild, target_id: int) -> discord.AuditLogEntry:
+        '''
+        Return the recent kick or ban entry targeting a user.
+
+        Returns:
+        --------
+            entry: :class:`discord.AuditLogEntry`
+                The entry or None if the user left on their own (or the
+                bot can not view the audit log).
+        '''
+
+        removed_at = datetime.utcnow()
+        entry = self._take(guild.id, target_id)
+        if entry or not guild.me.guild_permissions.view_audit_log:
+            return entry
+
+        fetched_at = await self._fetch(guild)
+        entry = self._take(guild.id, target_id)
+        if not entry and fetched_at and fetched_at < removed_at:
+            # Only a fetch that started before the removal can have missed it
+            await self._fetch(guild)
+            entry = self._take(guild.id, target_id)
+        return entry
+
+    def _take(self, guild_id: int, target_id: int) -> discord.AuditLogEntry:
+        entry = self._entries[guild_id].pop(target_id, None)
+        if entry and datetime.utcnow() - entry.created_at <= timedelta(seconds=self.window):
+            self.matched += 1
+            return entry
+        return None
+
+    async def _fetch(self, guild: discord.Guild) -> datetime:
+        '''
+        Join the next batched fetch of a guild.
+
+        Returns:
+        --------
+            started: :class:`datetime`
+                When the fetch started, None if it failed.
+        '''
+
+        task = self._batches.get(guild.id)
+        if not task:
+            task = self._batches[guild.id] = asyncio.create_task(self._batch(guild))
+        try:
+            return await asyncio.shield(task)
+        except discord.HTTPException:
+            return None
+
+    async def _batch(self, guild: discord.Guild) -> datetime:
+        try:
+            await asyncio.sleep(self.debounce)
+        finally:
+            # Removals from now on wait for the next batch
+            del self._batches[guild.id]
+        async with self._locks[guild.id]:
+            started = datetime.utcnow()
+            await self._load(guild)
+        return started
+
+    async def _load(self, guild: discord.Guild):
+        self.fetches += 1
+        cutoff = datetime.utcnow() - timedelta(seconds=self.window)
+        after = max(self._last_entry.get(guild.id, 0), discord.utils.time_snowflake(cutoff))
+
+        # Newest first, discord.py 1.7 ignores `after` when iterating
+        # oldest first and would page through the entire audit log
+        entries = self._entries[guild.id]
+        async for entry in guild.audit_logs(limit=None, oldest_first=False):
+            if entry.id <= after:
+                break
+            self._last_entry[guild.id] = max(self._last_entry.get(guild.id, 0), entry.id)
+            if entry.action in self.ACTIONS and entry.target:
+                known = entries.get(entry.target.id)
+                if not known or known.id < entry.id:
+                    entries[entry.target.id] = entry
+
+        # Forget entries nobody claimed in time
+        for target_id, entry in list(entries.items()):
+            if entry.created_at < cutoff:
+                del entries[target_id]
+
+
+audit_log_tracker = AuditLogTracker()
@@ -0,0 +1,167 @@
+import asyncio
+from datetime import datetime, timedelta
+from pymongo import ASCENDING, UpdateOne
+import pytz
+from utils.constants import FMT
+from utils.database import db
+
+RETRY_DELAY = timedelta(minutes=1)
+
+
+def birthday_window(birthday: datetime, timezone: str, now: datetime=None) -> tuple:
+    '''
+    Return the current or next birthday of a user as UTC instants.
+
+    A birthday lasts from midnight to midnight in the user's timezone,
+    people born on February 29th celebrate on the 28th in other years.
+
+    Parameters:
+    -----------
+        birthday: :class:`datetime`
+            Date of birth, only month and day are used.
+        timezone: :class:`str`
+            Name of the user's timezone, e.g. "Europe/Amsterdam".
+        now: :class:`datetime`
+            Naive UTC datetime the window has to end after, defaults to now.
+
+    Returns:
+    --------
+        :class:`tuple`:
+            Naive UTC start and end of the birthday.
+    '''
+
+    tz = pytz.timezone(timezone)
+    now = now or datetime.utcnow()
+    year = pytz.utc.localize(now).astimezone(tz).year - 1
+
+    while True:
+        try:
+            day = datetime(year, birthday.month, birthday.day)
+        except ValueError:  # February 29th outside of a leap year
+            day = datetime(year, 2, 28)
+        start = tz.localize(day).astimezone(pytz.utc).replace(tzinfo=None)
+        end = tz.localize(day + timedelta(days=1)).astimezone(pytz.utc).replace(tzinfo=None)
+        if end > now:
+            return start, end
+        year += 1
+
+
+class BirthdayScheduler():
+    '''
+    Wakes up at birthday boundaries only.
+
+    Every user with a birthday has the UTC start and end of their next
+    birthday stored in the indexed `birthday_start` and `birthday_end`
+    fields. The scheduler sleeps until the earliest boundary, flips the
+    users whose birthday started or ended and moves ended birthdays a
+    year ahead.
+
+    Attributes:
+    -----------
+        transitions: :class:`int`
+            Amount of birthdays started and ended.
+    '''
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._changed = asyncio.Event()
+        self.transitions = 0
+
+    def wake(self):
+        '''Recompute the next boundary, e.g. after a birthday was changed'''
+        self._changed.set()
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([('birthday_start', ASCENDING)], sparse=True)
+        await self.collection.create_index([('birthday_end', ASCENDING)], sparse=True)
+
+    async def schedule_missing(self):
+        '''Store the next birthday of users that have none stored yet'''
+        operations = []
+        async for user in self.collection.find(
+                {'birthday': {'$exists': True}, 'birthday_start': {'$exists': False}},
+                {'birthday': 1, 'timezone': 1}):
+            start, end = birthday_window(user['birthday'], user['timezone'])
+            operations.append(UpdateOne({'_id': user['_id']},
+                {'$set': {'birthday_start': start, 'birthday_end': end}}))
+        if operations:
+            await self.collection.bulk_write(operations, ordered=False)
+
+    async def _next_boundary(self) -> datetime:
+        starting = await self.collection.find_one(
+            {'birthday_start': {'$exists': True}, 'has_birthday_role': {'$ne': True}},
+            {'birthday_start': 1}, sort=[('birthday_start', ASCENDING)])
+        ending = await self.collection.find_one(
+            {'birthday_end': {'$exists': True}},
+            {'birthday_end': 1}, sort=[('birthday_end', ASCENDING)])
+        boundaries = [user[field] for user, field in
+                      ((starting, 'birthday_start'), (ending, 'birthday_end')) if user]
+        return min(boundaries, default=None)
+
+    async def _process(self, on_change) -> int:
+        now = datetime.utcnow()
+        transitions = self.transitions
+
+        # Ended birthdays first, so users away for a whole birthday are
+        # moved to next year instead of getting a role
+        ended = await self.collection.find({'birthday_end': {'$lte': now}},
+            {'birthday': 1, 'timezone': 1, 'has_birthday_role': 1}).to_list(None)
+        for user in ended:
+            if user.get('has_birthday_role'):
+                await on_change(user['_id'], False)
+                self.transitions += 1
+            start, end = birthday_window(user['birthday'], user['timezone'], now)
+            await self.collection.update_one({'_id': user['_id']},
+                {'$set': {'birthday_start': start, 'birthday_end': end, 'has_birthday_role': False}})
+
+        started = await self.collection.find(
+            {'birthday_start': {'$lte': now}, 'has_birthday_role': {'$ne': True}},
+            {'_id': 1}).to_list(None)
+        for user in started:
+            await on_change(user['_id'], True)
+            self.transitions += 1
+            await self.collection.update_one({'_id': user['_id']},
+                {'$set': {'has_birthday_role': True}})
+        return self.transitions - transitions
+
+    async def run(self, on_change, on_cycle=None):
+        '''
+        Process birthday boundaries as they pass, forever.
+
+        Parameters:
+        -----------
+            on_change: :class:`Callable[[int, bool], Awaitable]`
+                Called with the user id and whether their birthday
+                started (True) or ended (False).
+            on_cycle: :class:`Callable[[int], Awaitable]`
+                Called with the amount of transitions after every
+                boundary that flipped at least one birthday.
+        '''
+
+        prepared = False
+        while True:
+            self._changed.clear()
+            try:
+                if not prepared:
+                    await self.ensure_indexes()
+                    await self.schedule_missing()
+                    prepared = True
+                transitions = await self._process(on_change)
+                if transitions and on_cycle:
+                    await on_cycle(transitions)
+                boundary = await self._next_boundary()
+            except Exception as error:
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"Could not process birthdays: {error}")
+                boundary = datetime.utcnow() + RETRY_DELAY
+
+            timeout = None
+            if boundary:
+                timeout = max((boundary - datetime.utcnow()).total_seconds(), 0)
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+
+birthday_scheduler = BirthdayScheduler(db['Users'])
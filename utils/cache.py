@@ -0,0 +1,112 @@
+import collections
+import time
+from utils.database import db
+
+
+class GuildConfigCache():
+    '''
+    Process-wide cache of server documents from the `Servers` collection.
+
+    Every writer to `Servers` is responsible for calling `set` or
+    `invalidate` afterwards, entries are never expired on their own.
+
+    Attributes:
+    -----------
+        hits: :class:`int`
+            Amount of lookups answered from memory.
+        misses: :class:`int`
+            Amount of lookups that had to query the database.
+    '''
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.hits = 0
+        self.misses = 0
+        self._servers = {}
+
+    def __contains__(self, guild_id: int) -> bool:
+        return guild_id in self._servers
+
+    def __len__(self) -> int:
+        return len(self._servers)
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'size': len(self._servers)
+        }
+
+    async def get(self, guild_id: int) -> dict:
+        '''
+        Return the server document of a guild, querying the database
+        only if it is not cached yet.
+
+        Parameters:
+        -----------
+            guild_id: :class:`int`
+                Id of the guild to get the document of.
+
+        Returns:
+        --------
+            server: :class:`dict`
+                The server document or None if the guild is unknown.
+        '''
+
+        try:
+            server = self._servers[guild_id]
+        except KeyError:
+            self.misses += 1
+            server = await self.collection.find_one({'_id': guild_id})
+            self._servers[guild_id] = server
+        else:
+            self.hits += 1
+        return server
+
+    def set(self, guild_id: int, server: dict):
+        '''Replace the cached document of a guild'''
+        self._servers[guild_id] = server
+
+    def invalidate(self, guild_id: int):
+        '''Evict a guild, the next lookup will query the database'''
+        self._servers.pop(guild_id, None)
+
+    def clear(self):
+        '''Evict all guilds'''
+        self._servers.clear()
+
+
+class TTLCache():
+    '''
+    Small mapping whose entries expire `ttl` seconds after being set.
+
+    When `max_size` is reached the oldest entry is dropped.
+    '''
+
+    def __init__(self, ttl: float, max_size: int=1024):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = collections.OrderedDict()
+
+    def get(self, key, default=None):
+        try:
+            expiry, value = self._entries[key]
+        except KeyError:
+            return default
+        if expiry <= time.monotonic():
+            del self._entries[key]
+            return default
+        return value
+
+    def set(self, key, value):
+        self._entries.pop(key, None)
+        if len(self._entries) >= self.max_size:
+            self._entries.popitem(last=False)
+        self._entries[key] = (time.monotonic() + self.ttl, value)
+
+    def invalidate(self, key):
+        self._entries.pop(key, None)
+
+
+server_cache = GuildConfigCache(db['Servers'])
@@ -1,4 +1,4 @@
-from datetime import datetime
+from datetime import datetime, timedelta
 import discord
 import os
 
@@ -6,11 +6,29 @@ DISCORD_API_KEY = os.getenv('apikey_discordassistant')
 MONGODB_API_KEY = os.getenv('apikey_mongodb_discordassistant')
 OPENAI_API_KEY = os.getenv('apikey_openai')
 
+ARITHMETIC_MAX_BITS = 256
+ARITHMETIC_MAX_LENGTH = 200
+ARITHMETIC_MAX_OPERATIONS = 50
+
+AUDIT_LOG_DEBOUNCE = 1.5
+AUDIT_LOG_WINDOW = 10.0
+
+BANNED_WORDS_AUTOMATON_SIZE = 100
+
+COUNTING_FLUSH_INTERVAL = 5.0
+
+DATABASE_BACKEND = os.getenv('discordassistant_database', 'mongodb')
+DATABASE_POOL_SIZE = int(os.getenv('discordassistant_database_pool_size', 50))
+DATABASE_MIN_POOL_SIZE = int(os.getenv('discordassistant_database_min_pool_size', 0))
+DATABASE_TIMEOUT = float(os.getenv('discordassistant_database_timeout', 10))
+
 DEFAULT_CHANNELS = ['spawn', 'eject', 'log', 'birthday', 'counting']
 DEFAULT_EXP_INCREASE = 100
+DEFAULT_LEVEL_CURVE = 'triangular'
 DEFAULT_PREFIX = '.'
 DEFAULT_ROLES = ['muted', 'birthday']
 DEFAULT_MANAGERS = ['role_managers', 'polls', 'events']
+DEPARTED_RETENTION = timedelta(days=14)
 
 EPOCH = datetime(1970, 1, 1)
 EVENT_COLOUR = discord.Colour.purple()
@@ -20,6 +38,11 @@ EVENT_EMOTES = {
     '❌': "Not attending",
     '❓': "Unsure"
 }
+EXPERIENCE_CACHE_SIZE = 50000
+EXPERIENCE_COOLDOWN = 60.0
+EXPERIENCE_COOLDOWN_SIZE = 100000
+EXPERIENCE_FLUSH_INTERVAL = 10.0
+EXPERIENCE_FLUSH_SIZE = 500
 EXPRESSIONS = ["*", "/", "+", "-", "%", "(", ")", " ", "."]
 
 FMT = '%y-%m-%d %H:%M:%S'
@@ -76,7 +99,23 @@ NUMBER_EMOTES_UNICODE = [
     "\u0039\uFE0F\u20E3"
 ]
 
+LEADERBOARD_PAGE_SIZE = 8
+LEADERBOARD_SIZE = 80
+LEADERBOARD_TTL = 30.0
+
+LOG_SINK_BACKLOG = 50
+LOG_SINK_LATENCY = 2.0
+
 MAX_LEVEL = 100
+MESSAGE_ALIVE_TTL = 86400.0
+MESSAGE_VERIFY_CONCURRENCY = 4
+MIGRATION_BATCH_DELAY = 0.5
+MIGRATION_BATCH_SIZE = 500
+
+POLL_FLUSH_INTERVAL = 30.0
+POLL_RENDER_INTERVAL = float(os.getenv('discordassistant_poll_render_interval', 5.0))
+
+RECONCILE_CONCURRENCY = 5
 
 TIMEZONE_CATEGORIES = [
     "Africa",
@@ -91,6 +130,7 @@ TIMEZONE_CATEGORIES = [
 ]
 
 TOTAL_BARS = 20
+TRANSCRIPT_RETENTION = int(os.getenv('discordassistant_transcript_retention', 0))
 
 CHAT_FORMATTERS: {
     'cursive': '*{}*',
@@ -0,0 +1,116 @@
+from array import array
+from datetime import datetime
+import time
+
+
+class CooldownTable():
+    '''
+    Bounded in-memory table of (guild, user) cooldowns.
+
+    Entries live in a ring of three preallocated parallel arrays (guild
+    ids, user ids and expiries), a dict maps each key, packed into a
+    single int, to its slot. A key keeps its slot when its cooldown is
+    restarted, so every slot in use holds a tracked key. Entries expire on
+    their own `window` seconds after they were started and are purged
+    lazily from the oldest end. When `max_size` keys are tracked the
+    oldest one is dropped, callers then fall back to whatever they know
+    about the key (see `seed`).
+
+    Attributes:
+    -----------
+        window: :class:`float`
+            Length of a cooldown in seconds.
+        max_size: :class:`int`
+            Maximum amount of simultaneously tracked keys.
+        rejected: :class:`int`
+            Amount of `active` checks that hit a running cooldown.
+        evicted: :class:`int`
+            Amount of running cooldowns dropped because the table was full.
+    '''
+
+    __slots__ = ('window', 'max_size', 'rejected', 'evicted',
+                 '_guilds', '_users', '_expiries', '_slots', '_head', '_used')
+
+    def __init__(self, window: float, max_size: int):
+        self.window = window
+        self.max_size = max_size
+        self.rejected = 0
+        self.evicted = 0
+
+        self._guilds = array('Q', bytes(8*max_size))
+        self._users = array('Q', bytes(8*max_size))
+        self._expiries = array('d', bytes(8*max_size))
+        self._slots = {}
+        self._head = 0  # Oldest slot
+        self._used = 0  # Slots in use from the head on, including released ones
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    @staticmethod
+    def _pack(key: tuple) -> int:
+        guild_id, user_id = key
+        return guild_id << 64 | user_id
+
+    def _pop_oldest(self):
+        slot = self._head
+        del self._slots[self._guilds[slot] << 64 | self._users[slot]]
+        self._head = (slot + 1) % self.max_size
+        self._used -= 1
+
+    def _purge(self, now: float):
+        '''Remove expired entries from the oldest end'''
+        while self._used and self._expiries[self._head] <= now:
+            self._pop_oldest()
+
+    def _insert(self, key: tuple, expiry: float):
+        packed = self._pack(key)
+        slot = self._slots.get(packed)
+        if slot is None:
+            now = time.monotonic()
+            self._purge(now)
+            if self._used >= self.max_size:
+                if self._expiries[self._head] > now:
+                    self.evicted += 1
+                self._pop_oldest()
+
+            slot = (self._head + self._used) % self.max_size
+            self._guilds[slot], self._users[slot] = key
+            self._slots[packed] = slot
+            self._used += 1
+        self._expiries[slot] = expiry
+
+    def active(self, key: tuple) -> bool:
+        '''Whether `key` is on cooldown, never touches the database'''
+
+        now = time.monotonic()
+        self._purge(now)
+        slot = self._slots.get(self._pack(key))
+        if slot is None:
+            return False
+        if self._expiries[slot] <= now:
+            return False  # Expired, the slot is reused if the key restarts
+        self.rejected += 1
+        return True
+
+    def start(self, key: tuple):
+        '''Start a full cooldown for `key`'''
+        self._insert(key, time.monotonic() + self.window)
+
+    def seed(self, key: tuple, last_used: datetime) -> bool:
+        '''
+        Rebuild the cooldown of `key` from a stored (UTC) timestamp,
+        used after a restart or after the key was evicted.
+
+        Returns:
+        --------
+            active: :class:`bool`
+                Whether the key is still on cooldown.
+        '''
+
+        remaining = self.window - (datetime.utcnow() - last_used).total_seconds()
+        if remaining <= 0:
+            return False
+        self._insert(key, time.monotonic() + remaining)
+        self.rejected += 1
+        return True
@@ -0,0 +1,134 @@
+import asyncio
+import collections
+from datetime import datetime
+from utils.constants import FMT
+from utils.database import db
+
+
+class CountingState():
+    '''
+    In-memory state of a guild's counting channel.
+
+    Attributes:
+    -----------
+        current: :class:`int`
+            The number that has to be counted next.
+        last_counter: :class:`int`
+            Id of the user that counted last.
+        persisted: :class:`tuple`
+            (current, last_counter) as they are stored in the database,
+            used as the expected value of the compare-and-set write.
+    '''
+
+    __slots__ = ('current', 'last_counter', 'persisted')
+
+    def __init__(self, counting: dict):
+        self.persisted = (counting.get('current'), counting.get('last_counter'))
+        self.current = self.persisted[0] or 1
+        self.last_counter = self.persisted[1]
+
+    @property
+    def dirty(self) -> bool:
+        return (self.current, self.last_counter) != self.persisted
+
+    def judge(self, value, user_id: int) -> tuple:
+        '''
+        Check a counted value and advance or reset the count.
+
+        Returns:
+        --------
+            :class:`tuple`:
+                Whether the value was correct and the number that was expected.
+        '''
+
+        expected = self.current
+        if value == expected and user_id != self.last_counter:
+            self.current += 1
+            self.last_counter = user_id
+            return True, expected
+
+        self.current = 1
+        self.last_counter = 0
+        return False, expected
+
+
+class CountingStore():
+    '''
+    Counting state of all guilds, persisted write-behind.
+
+    Each state is loaded from the server document by the first message
+    of a channel and judged in memory afterwards, under a per-guild lock
+    (a guild has one counting channel). `flush` writes changed states
+    with a compare-and-set on the last persisted values, states that
+    were changed by someone else in the meantime are dropped and reloaded.
+
+    Attributes:
+    -----------
+        flushed: :class:`int`
+            Amount of states written.
+        conflicts: :class:`int`
+            Amount of writes rejected because the stored state changed.
+    '''
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._states = {}
+        self._locks = collections.defaultdict(asyncio.Lock)
+        self.flushed = 0
+        self.conflicts = 0
+
+    async def judge(self, guild_id: int, value, user_id: int) -> tuple:
+        '''
+        Judge a counted value in a guild's counting channel.
+
+        Messages of a channel are judged one at a time, the state is
+        loaded from the database by the first of them.
+
+        Returns:
+        --------
+            :class:`tuple`:
+                Whether the value was correct and the number that was expected.
+        '''
+
+        async with self._locks[guild_id]:
+            state = self._states.get(guild_id)
+            if state is None:
+                server = await self.collection.find_one({'_id': guild_id}, {'counting': 1}) or {}
+                state = self._states[guild_id] = CountingState(server.get('counting') or {})
+            return state.judge(value, user_id)
+
+    def drop(self, guild_id: int):
+        '''Forget a guild's state, it is reloaded on the next message'''
+        self._states.pop(guild_id, None)
+
+    async def _persist(self, guild_id: int, state: CountingState):
+        expected = state.persisted
+        snapshot = (state.current, state.last_counter)
+        result = await self.collection.update_one(
+            {'_id': guild_id,
+             'counting.current': expected[0],
+             'counting.last_counter': expected[1]},
+            {'$set': {'counting.current': snapshot[0],
+                      'counting.last_counter': snapshot[1]}}
+        )
+        # The cached server document is left alone, counting state is never read from it
+
+        if result.matched_count:
+            state.persisted = snapshot
+            self.flushed += 1
+        else:
+            self.conflicts += 1
+            if self._states.get(guild_id) is state:
+                del self._states[guild_id]
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Counting state of guild {guild_id} changed elsewhere, reloading.")
+
+    async def flush(self):
+        '''Write all changed counting states'''
+
+        dirty = [(guild_id, state) for guild_id, state in self._states.items() if state.dirty]
+        if dirty:
+            await asyncio.gather(*(self._persist(*item) for item in dirty))
+
+
+counting_store = CountingStore(db['Servers'])
@@ -1,19 +1,163 @@
-import pymongo
-from pymongo import MongoClient
-from utils.constants import MONGODB_API_KEY
+import asyncio
+from motor.motor_asyncio import AsyncIOMotorClient
+from utils.constants import DATABASE_BACKEND, DATABASE_MIN_POOL_SIZE, DATABASE_POOL_SIZE, DATABASE_TIMEOUT, MONGODB_API_KEY
 
-cluster = MongoClient(MONGODB_API_KEY)
-db = cluster['DiscordAssistantCluster']
+try:
+    import mongomock
+except ImportError:
+    mongomock = None
+
+DATABASE_NAME = 'DiscordAssistantCluster'
+
+
+class Cursor():
+    '''
+    Awaitable wrapper around a motor or in-memory cursor.
+
+    Chaining methods (sort, skip, limit, ...) are passed through, results
+    are obtained with `async for` or `await cursor.to_list(length)`.
+    '''
+
+    def __init__(self, cursor, timeout: float):
+        self._cursor = cursor
+        self.timeout = timeout
+
+    def __getattr__(self, name):
+        attribute = getattr(self._cursor, name)
+        if not callable(attribute):
+            return attribute
+
+        def chain(*args, **kwargs):
+            self._cursor = attribute(*args, **kwargs)
+            return self
+        return chain
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if hasattr(self._cursor, 'to_list'):
+            while True:
+                try:
+                    yield await asyncio.wait_for(self._cursor.__anext__(), self.timeout)
+                except StopAsyncIteration:
+                    return
+        else:
+            for document in self._cursor:
+                yield document
+
+    async def to_list(self, length: int=None) -> list:
+        if hasattr(self._cursor, 'to_list'):
+            return await asyncio.wait_for(self._cursor.to_list(length), self.timeout)
+        documents = []
+        for document in self._cursor:
+            if length is not None and len(documents) >= length:
+                break
+            documents.append(document)
+        return documents
+
+
+class Collection():
+    '''
+    Collection whose operations are all awaited with a per-call timeout.
+
+    Wraps either a motor collection or a synchronous in-memory one,
+    so cogs do not need to know which backend is in use.
+    '''
+
+    _cursor_methods = ('find', 'aggregate', 'list_indexes')
+
+    def __init__(self, collection, timeout: float):
+        self._collection = collection
+        self.timeout = timeout
+        self.name = collection.name
+
+    def __getattr__(self, name):
+        method = getattr(self._collection, name)
+        if name in self._cursor_methods:
+            def cursor(*args, **kwargs):
+                return Cursor(method(*args, **kwargs), self.timeout)
+            return cursor
+
+        async def call(*args, timeout: float=None, **kwargs):
+            result = method(*args, **kwargs)
+            if asyncio.iscoroutine(result) or asyncio.isfuture(result):
+                result = await asyncio.wait_for(result, timeout or self.timeout)
+            return result
+        return call
+
+
+class Database():
+    '''
+    Asyncio data-access layer used by all cogs.
+
+    Attributes:
+    -----------
+        backend: :class:`str`
+            Either 'mongodb' for a real cluster or 'memory' for an
+            in-memory stand-in (requires mongomock).
+        timeout: :class:`float`
+            Default amount of seconds a single database call may take.
+    '''
+
+    def __init__(self, database, backend: str, timeout: float):
+        self._database = database
+        self.backend = backend
+        self.timeout = timeout
+        self._collections = {}
+
+    def __getitem__(self, name: str) -> Collection:
+        try:
+            return self._collections[name]
+        except KeyError:
+            collection = Collection(self._database[name], self.timeout)
+            self._collections[name] = collection
+            return collection
+
+
+def connect(uri: str=MONGODB_API_KEY,
+            backend: str=DATABASE_BACKEND,
+            pool_size: int=DATABASE_POOL_SIZE,
+            min_pool_size: int=DATABASE_MIN_POOL_SIZE,
+            timeout: float=DATABASE_TIMEOUT) -> tuple:
+    '''
+    Create the client and database for a backend.
+
+    Returns:
+    --------
+        :class:`tuple`:
+            cluster: The underlying (motor or mongomock) client.
+            db: :class:`Database` wrapping the bot's database.
+    '''
+
+    if backend == 'memory':
+        if mongomock is None:
+            raise RuntimeError("The in-memory database backend requires mongomock.")
+        cluster = mongomock.MongoClient()
+    elif backend == 'mongodb':
+        cluster = AsyncIOMotorClient(
+            uri,
+            maxPoolSize=pool_size,
+            minPoolSize=min_pool_size,
+            serverSelectionTimeoutMS=int(timeout*1000),
+            waitQueueTimeoutMS=int(timeout*1000)
+        )
+    else:
+        raise ValueError(f"Unknown database backend {backend}.")
+
+    return cluster, Database(cluster[DATABASE_NAME], backend, timeout)
+
+
+cluster, db = connect()
 
 DEFAULT_USER = {
-    '_id': 0,
-    'servers': {
-        }
+    '_id': 0
 }
 
 DEFAULT_SERVER = {
     '_id': 0,
     'prefix': '.',
+    'level_curve': 'triangular',
     'banned_words': [],
     'roles': {
         'muted': 0,
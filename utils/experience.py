@@ -0,0 +1,170 @@
+import asyncio
+import collections
+from datetime import datetime
+from pymongo.errors import BulkWriteError
+import time
+from utils.constants import EPOCH, EXPERIENCE_CACHE_SIZE, EXPERIENCE_COOLDOWN, EXPERIENCE_COOLDOWN_SIZE, EXPERIENCE_FLUSH_SIZE
+from utils.cooldown import CooldownTable
+from utils.database import db
+from utils.members import get_member, upsert_member
+
+
+class ExperienceBuffer():
+    '''
+    Write-behind accumulator for experience grants.
+
+    Grants are applied to an in-memory view straight away, so level ups
+    can be detected without waiting for the database, and are written
+    to `Members` as a single unordered `bulk_write` on `flush`.
+
+    Attributes:
+    -----------
+        max_pending: :class:`int`
+            Amount of buffered (guild, user) pairs after which `full` is True.
+        max_cached: :class:`int`
+            Maximum amount of (guild, user) pairs kept in the view.
+        flushes: :class:`int`
+            Amount of flushes that wrote at least one grant.
+        last_flush_size: :class:`int`
+            Amount of update operations in the last flush.
+        last_flush_latency: :class:`float`
+            Seconds the last `bulk_write` took.
+    '''
+
+    def __init__(self, collection,
+                 max_pending: int=EXPERIENCE_FLUSH_SIZE,
+                 max_cached: int=EXPERIENCE_CACHE_SIZE):
+        self.collection = collection
+        self.max_pending = max_pending
+        self.max_cached = max_cached
+
+        self._view = collections.OrderedDict()
+        self._pending = {}
+        self._flush_lock = asyncio.Lock()
+
+        self.flushes = 0
+        self.flushed = 0
+        self.last_flush_size = 0
+        self.last_flush_latency = 0.0
+
+    @property
+    def full(self) -> bool:
+        return len(self._pending) >= self.max_pending
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'pending': len(self._pending),
+            'cached': len(self._view),
+            'flushes': self.flushes,
+            'flushed': self.flushed,
+            'last_flush_size': self.last_flush_size,
+            'last_flush_latency': self.last_flush_latency
+        }
+
+    async def get(self, guild_id: int, user_id: int) -> list:
+        '''
+        Return the current experience and last experience gain of a
+        member, loading them from the database on first use.
+
+        Returns:
+        --------
+            entry: :class:`list`
+                [experience, last_experience_gain] including buffered grants.
+        '''
+
+        key = (guild_id, user_id)
+        try:
+            entry = self._view[key]
+        except KeyError:
+            pass
+        else:
+            self._view.move_to_end(key)
+            return entry
+
+        member = await get_member(guild_id, user_id) or {}
+        loaded = [member.get('experience', 0), member.get('last_experience_gain', EPOCH)]
+
+        # Another message may have loaded and granted in the meantime
+        entry = self._view.setdefault(key, loaded)
+        self._evict()
+        return entry
+
+    def grant(self, guild_id: int, user_id: int, amount: int) -> tuple:
+        '''
+        Buffer an experience grant, `get` must have been awaited first.
+
+        Returns:
+        --------
+            :class:`tuple`:
+                Experience before and after the grant.
+        '''
+
+        now = datetime.utcnow()
+        key = (guild_id, user_id)
+        entry = self._view[key]
+        old_experience = entry[0]
+        entry[0] += amount
+        entry[1] = now
+
+        pending = self._pending.setdefault(key, [0, now])
+        pending[0] += amount
+        pending[1] = now
+        return old_experience, entry[0]
+
+    def _evict(self):
+        '''Drop least recently used entries without buffered grants'''
+        overflow = len(self._view) - self.max_cached
+        if overflow <= 0:
+            return
+        for key in list(self._view):
+            if overflow <= 0:
+                break
+            if key not in self._pending:
+                del self._view[key]
+                overflow -= 1
+
+    def _requeue(self, grants):
+        for key, (amount, last_gain) in grants:
+            entry = self._pending.setdefault(key, [0, last_gain])
+            entry[0] += amount
+            entry[1] = max(entry[1], last_gain)
+
+    async def flush(self):
+        '''Write all buffered grants in a single unordered bulk write'''
+
+        async with self._flush_lock:
+            pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            operations = [
+                upsert_member(guild_id, user_id,
+                    {'$inc': {'experience': amount},
+                     '$set': {'last_experience_gain': last_gain}})
+                for (guild_id, user_id), (amount, last_gain) in pending.items()
+            ]
+
+            start = time.perf_counter()
+            try:
+                await self.collection.bulk_write(operations, ordered=False)
+            except BulkWriteError as error:
+                # Unordered, so everything but the failed operations was applied
+                grants = list(pending.items())
+                self._requeue(grants[write_error['index']]
+                              for write_error in error.details.get('writeErrors', []))
+                raise
+            except Exception:
+                # Put the grants back so the next flush retries them
+                self._requeue(pending.items())
+                raise
+            finally:
+                self.last_flush_latency = time.perf_counter() - start
+
+            self.flushes += 1
+            self.flushed += len(operations)
+            self.last_flush_size = len(operations)
+
+
+experience_buffer = ExperienceBuffer(db['Members'])
+experience_cooldowns = CooldownTable(EXPERIENCE_COOLDOWN, EXPERIENCE_COOLDOWN_SIZE)
@@ -0,0 +1,65 @@
+from array import array
+
+
+class MemberGuildIndex():
+    '''
+    Reverse index from user id to the ids of the guilds they are in.
+
+    Guild ids of a user are kept in a compact unsigned 64-bit array,
+    the index is built from the gateway member cache on ready and
+    maintained from member and guild events. discord.py has no event for
+    chunked guilds, guilds are chunked through `index_guild` instead.
+    '''
+
+    def __init__(self):
+        self._guilds = {}
+
+    def __len__(self) -> int:
+        return len(self._guilds)
+
+    def get(self, user_id: int) -> tuple:
+        '''Return the ids of the guilds a user is in'''
+        return tuple(self._guilds.get(user_id, ()))
+
+    def add(self, user_id: int, guild_id: int):
+        try:
+            guild_ids = self._guilds[user_id]
+        except KeyError:
+            self._guilds[user_id] = array('Q', (guild_id,))
+        else:
+            if guild_id not in guild_ids:
+                guild_ids.append(guild_id)
+
+    def remove(self, user_id: int, guild_id: int):
+        guild_ids = self._guilds.get(user_id)
+        if guild_ids is None or guild_id not in guild_ids:
+            return
+        guild_ids.remove(guild_id)
+        if not guild_ids:
+            del self._guilds[user_id]
+
+    def add_guild(self, guild):
+        '''Index all cached members of a guild, e.g. after it was chunked'''
+        for member in guild.members:
+            self.add(member.id, guild.id)
+
+    def remove_guild(self, guild):
+        '''Remove a guild the bot left or lost access to'''
+        for member in guild.members:
+            self.remove(member.id, guild.id)
+
+    def build(self, guilds: list):
+        '''Rebuild the index from scratch'''
+        self._guilds.clear()
+        for guild in guilds:
+            self.add_guild(guild)
+
+
+member_guilds = MemberGuildIndex()
+
+
+async def index_guild(guild):
+    '''Chunk a guild if its members are not all cached yet and index them'''
+    if not guild.chunked:
+        await guild.chunk()
+    member_guilds.add_guild(guild)
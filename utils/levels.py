@@ -0,0 +1,80 @@
+import bisect
+from typing import Callable, Iterable, List
+from utils.constants import DEFAULT_LEVEL_CURVE, MAX_LEVEL
+
+
+class LevelCurve():
+    '''
+    Experience curve with thresholds precomputed up to `max_level`.
+
+    Attributes:
+    -----------
+        name: :class:`str`
+            Name the curve is stored under in a server's `level_curve`.
+        description: :class:`str`
+            Short human readable explanation of the curve.
+        thresholds: :class:`List[int]`
+            Total experience required for every level from 0 to `max_level`.
+    '''
+
+    __slots__ = ('name', 'description', 'max_level', 'thresholds', '_formula')
+
+    def __init__(self, name: str, description: str, formula: Callable, max_level: int=MAX_LEVEL):
+        self.name = name
+        self.description = description
+        self.max_level = max_level
+        self._formula = formula
+        self.thresholds = [int(formula(level)) for level in range(max_level+1)]
+
+    def level_to_exp(self, level: int) -> int:
+        '''Total experience required to reach `level`'''
+        if 0 <= level <= self.max_level:
+            return self.thresholds[level]
+        return int(self._formula(level))
+
+    def exp_to_level(self, exp: int) -> int:
+        '''
+        Level reached with `exp` total experience, found by binary search.
+
+        Like the original formula, reaching the level below the cap
+        already counts as reaching `max_level`.
+        '''
+        level = bisect.bisect_right(self.thresholds, exp) - 1
+        if level >= self.max_level - 1:
+            return self.max_level
+        return max(level, 0)
+
+    def exp_to_levels(self, exps: Iterable[int]) -> List[int]:
+        '''Batched `exp_to_level`, e.g. for a whole leaderboard page'''
+        return [self.exp_to_level(exp) for exp in exps]
+
+
+LEVEL_CURVES = {
+    curve.name: curve for curve in (
+        LevelCurve('triangular', "Every level takes 1000 more experience than the last.",
+                   lambda level: 1000 * level * (level+1) // 2),
+        LevelCurve('linear', "Every level takes 5000 experience.",
+                   lambda level: 5000 * level),
+        LevelCurve('quadratic', "Levels get steeper quickly, 1000 times the level squared.",
+                   lambda level: 1000 * level**2),
+        LevelCurve('exponential', "Every level takes 10% more experience than the last.",
+                   lambda level: 10000 * (1.1**level - 1))
+    )
+}
+
+
+def get_level_curve(server: dict=None) -> LevelCurve:
+    '''
+    Return the level curve a server has picked.
+
+    Parameters:
+    -----------
+        server: :class:`dict`
+            Server document, the default curve is used if it is missing
+            or has no (valid) `level_curve`.
+    '''
+
+    try:
+        return LEVEL_CURVES[server['level_curve']]
+    except (KeyError, TypeError):
+        return LEVEL_CURVES[DEFAULT_LEVEL_CURVE]
@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+import discord
+import io
+from utils.cache import server_cache
+from utils.constants import FMT, LOG_SINK_BACKLOG, LOG_SINK_LATENCY
+
+MAX_EMBEDS = 10  # Embeds per message
+MAX_EMBEDS_LENGTH = 6000  # Characters over all embeds of a message
+WEBHOOK_NAME = "DiscordAssistant logs"
+
+
+class LogSink():
+    '''
+    Per-guild queue of log embeds, coalesced into as few sends as possible.
+
+    Entries are sent at most `latency` seconds after the first of them
+    was queued, packed up to Discord's embeds per message limit through a
+    webhook in the log channel. Without permission to manage webhooks
+    every embed is sent on its own. When more than `backlog` entries are
+    waiting they are sent as a single digest file instead.
+
+    Attributes:
+    -----------
+        queued: :class:`int`
+            Amount of entries logged.
+        sends: :class:`int`
+            Amount of messages sent to log channels.
+        digests: :class:`int`
+            Amount of backlogs sent as a digest file.
+    '''
+
+    def __init__(self, latency: float=LOG_SINK_LATENCY, backlog: int=LOG_SINK_BACKLOG):
+        self.latency = latency
+        self.backlog = backlog
+        self._queues = {}
+        self._tasks = {}
+        self._webhooks = {}
+
+        self.queued = 0
+        self.sends = 0
+        self.digests = 0
+
+    def log(self, guild: discord.Guild, embed: discord.Embed):
+        '''Queue an embed for the log channel of a guild'''
+
+        _, queue = self._queues.setdefault(guild.id, (guild, []))
+        queue.append(embed)
+        self.queued += 1
+        if guild.id not in self._tasks:
+            self._tasks[guild.id] = asyncio.create_task(self._flush_later(guild.id))
+
+    async def _flush_later(self, guild_id: int):
+        try:
+            await asyncio.sleep(self.latency)
+        finally:
+            self._tasks.pop(guild_id, None)
+        await self.flush(guild_id)
+
+    async def flush_all(self):
+        '''Send everything that is queued, e.g. before unloading'''
+        for task in list(self._tasks.values()):
+            task.cancel()
+        self._tasks.clear()
+        await asyncio.gather(*(self.flush(guild_id) for guild_id in list(self._queues)))
+
+    async def flush(self, guild_id: int):
+        '''Send the queued entries of a guild'''
+
+        try:
+            guild, embeds = self._queues.pop(guild_id)
+        except KeyError:
+            return
+
+        server = await server_cache.get(guild_id)
+        try:
+            log_channel = guild.get_channel(server['channels']['log'])
+        except (KeyError, TypeError):
+            return
+        if not log_channel:
+            return
+
+        try:
+            if len(embeds) > self.backlog:
+                await self._send_digest(log_channel, embeds)
+            else:
+                await self._send_batches(log_channel, embeds)
+        except discord.HTTPException as error:
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Could not send {len(embeds)} log entries to guild {guild_id}: {error}")
+
+    async def _webhook(self, channel: discord.TextChannel):
+        '''Return the log webhook of a channel or None without permission'''
+
+        try:
+            return self._webhooks[channel.id]
+        except KeyError:
+            pass
+
+        webhook = None
+        if channel.permissions_for(channel.guild.me).manage_webhooks:
+            webhook = discord.utils.get(await channel.webhooks(), name=WEBHOOK_NAME)
+            if not webhook:
+                webhook = await channel.create_webhook(name=WEBHOOK_NAME)
+        self._webhooks[channel.id] = webhook
+        return webhook
+
+    async def _send_batches(self, channel: discord.TextChannel, embeds: list):
+        webhook = await self._webhook(channel)
+        if not webhook:
+            for embed in embeds:
+                await channel.send(embed=embed)
+                self.sends += 1
+            return
+
+        me = channel.guild.me
+        batch, length = [], 0
+        for embed in embeds + [None]:
+            if batch and (embed is None or len(batch) == MAX_EMBEDS
+                          or length + len(embed) > MAX_EMBEDS_LENGTH):
+                try:
+                    await webhook.send(embeds=batch, username=me.display_name, avatar_url=me.avatar_url)
+                except discord.NotFound:
+                    # Webhook was deleted, create a new one next time
+                    self._webhooks.pop(channel.id, None)
+                    raise
+                self.sends += 1
+                batch, length = [], 0
+            if embed is not None:
+                batch.append(embed)
+                length += len(embed)
+
+    async def _send_digest(self, channel: discord.TextChannel, embeds: list):
+        digest = io.StringIO()
+        for embed in embeds:
+            print(embed.title or "", file=digest)
+            if embed.description:
+                print(embed.description, file=digest)
+            for field in embed.fields:
+                print(f"{field.name} {field.value}", file=digest)
+            print(file=digest)
+
+        summary = discord.Embed(
+            title=f"{len(embeds)} log entries",
+            description="Too many events to log separately, see the attached digest.",
+            colour=discord.Colour.dark_grey()
+        )
+        file_name = f"[{datetime.utcnow().strftime(FMT)}]_log_digest.txt"
+        await channel.send(embed=summary,
+            file=discord.File(io.BytesIO(digest.getvalue().encode()), file_name))
+        self.sends += 1
+        self.digests += 1
+
+
+log_sink = LogSink()
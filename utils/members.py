@@ -0,0 +1,219 @@
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from utils.constants import DEPARTED_RETENTION
+from utils.database import db
+
+# Fields of a membership that are counters and have to be added up when
+# legacy data is merged into a document new code already wrote to.
+COUNTER_FIELDS = ('experience', 'warnings')
+MIGRATION_ID = 'membership_migration'
+
+
+class Compatibility():
+    '''
+    Whether the legacy `Users.servers.<guild_id>` layout may still hold
+    memberships that were not moved to `Members` yet.
+
+    Enabled until the migration in utils.migrations has finished.
+    '''
+
+    enabled = True
+
+
+def member_filter(guild_id: int, user_id: int) -> dict:
+    '''Query matching the membership document of a (guild, user) pair'''
+    return {'guild_id': guild_id, 'user_id': user_id}
+
+
+async def ensure_member_indexes():
+    '''Create the Members indexes and find out if compatibility reads are needed'''
+
+    members = db['Members']
+    await members.create_index([('guild_id', ASCENDING), ('user_id', ASCENDING)], unique=True)
+    await members.create_index([('guild_id', ASCENDING), ('experience', DESCENDING), ('user_id', ASCENDING)])
+    await members.create_index([('user_id', ASCENDING)])
+    await members.create_index([('muted_until', ASCENDING)], sparse=True)
+    # Departed members and users are removed by MongoDB itself
+    await members.create_index([('expire_at', ASCENDING)], expireAfterSeconds=0)
+    await db['Users'].create_index([('expire_at', ASCENDING)], expireAfterSeconds=0)
+
+    migration = await db['Meta'].find_one({'_id': MIGRATION_ID})
+    Compatibility.enabled = not (migration and migration.get('complete'))
+
+
+def legacy_update(legacy: dict, member: dict=None) -> dict:
+    '''
+    Build the update merging a legacy `servers.<guild_id>` entry into a
+    membership document.
+
+    Parameters:
+    -----------
+        legacy: :class:`dict`
+            The legacy entry from the user document.
+        member: :class:`dict`
+            The current membership document if one exists, fields it
+            already has take precedence over legacy ones.
+    '''
+
+    member = member or {}
+    update = {'$set': {'migrated': True}}
+    for field, value in (legacy or {}).items():
+        if field in COUNTER_FIELDS:
+            update.setdefault('$inc', {})[field] = value
+        elif field not in member:
+            update['$set'][field] = value
+    if 'leave_date' in update['$set']:
+        update['$set']['expire_at'] = update['$set']['leave_date'] + DEPARTED_RETENTION
+    return update
+
+
+def departure(now: datetime=None) -> dict:
+    '''Fields marking a member or user as departed, expiring them later'''
+    now = now or datetime.utcnow()
+    return {'leave_date': now, 'expire_at': now + DEPARTED_RETENTION}
+
+
+# Unsetting these marks a departed member or user as present again
+ARRIVAL = {'leave_date': '', 'expire_at': ''}
+
+
+async def expire_disconnected_users(user_ids: list, now: datetime=None) -> int:
+    '''
+    Mark users as departed if they are no longer present in any guild.
+
+    Users with legacy memberships that were not migrated yet are left
+    alone, like before the `Members` collection existed.
+
+    Returns:
+    --------
+        expired: :class:`int`
+            Amount of users marked as departed.
+    '''
+
+    connected = await db['Members'].distinct('user_id',
+        {'user_id': {'$in': list(user_ids)}, 'leave_date': {'$exists': False}})
+    disconnected = set(user_ids) - set(connected)
+    if not disconnected:
+        return 0
+    result = await db['Users'].update_many(
+        {'_id': {'$in': list(disconnected)},
+         'servers': {'$in': [{}, None]},
+         'leave_date': {'$exists': False}},
+        {'$set': departure(now)})
+    return result.modified_count
+
+
+async def migrate_member(guild_id: int, user_id: int, member: dict=None) -> dict:
+    '''
+    Move a single legacy membership to `Members` and return the result.
+
+    Safe to call concurrently and repeatedly, a membership is only ever
+    merged once thanks to its `migrated` flag.
+    '''
+
+    user = await db['Users'].find_one({'_id': user_id}, {f'servers.{guild_id}': 1})
+    try:
+        legacy = user['servers'][str(guild_id)]
+    except (KeyError, TypeError):
+        legacy = None
+
+    if legacy is None:
+        # Nothing to merge, only remember that this membership is done
+        if member:
+            await db['Members'].update_one(member_filter(guild_id, user_id),
+                {'$set': {'migrated': True}})
+            member['migrated'] = True
+        return member
+
+    query = {**member_filter(guild_id, user_id), 'migrated': {'$ne': True}}
+    try:
+        await db['Members'].update_one(query, legacy_update(legacy, member), upsert=True)
+    except DuplicateKeyError:
+        pass  # Migrated in the meantime
+    return await db['Members'].find_one(member_filter(guild_id, user_id))
+
+
+async def get_member(guild_id: int, user_id: int) -> dict:
+    '''
+    Return the membership document of a user in a guild.
+
+    While compatibility is enabled, memberships that were not migrated yet
+    are read from the legacy layout and migrated on the fly.
+
+    Returns:
+    --------
+        member: :class:`dict`
+            The membership document or None if there is none.
+    '''
+
+    member = await db['Members'].find_one(member_filter(guild_id, user_id))
+    if Compatibility.enabled and not (member and member.get('migrated')):
+        member = await migrate_member(guild_id, user_id, member)
+    return member
+
+
+def upsert_member(guild_id: int, user_id: int, update: dict) -> UpdateOne:
+    '''Bulk write operation updating (or creating) a membership'''
+    return UpdateOne(member_filter(guild_id, user_id), update, upsert=True)
+
+
+async def sync_guild_members(guild) -> tuple:
+    '''
+    Bring the stored memberships of a guild in line with the gateway
+    member cache.
+
+    The cached members are diffed against a snapshot of the guild's
+    `Members` documents and only the differences are written: new
+    members are added, returning members lose their leave date and
+    members that left without the bot noticing get one.
+
+    Parameters:
+    -----------
+        guild: :class:`discord.Guild`
+            Guild to sync, its member cache must be complete (chunked).
+
+    Returns:
+    --------
+        :class:`tuple`:
+            Amount of members scanned and amount of memberships changed.
+    '''
+
+    now = datetime.utcnow()
+    present = {member.id for member in guild.members if not member.bot}
+    stored = {
+        member['user_id']: 'leave_date' in member
+        async for member in db['Members'].find({'guild_id': guild.id},
+                                               {'_id': 0, 'user_id': 1, 'leave_date': 1})
+    }
+
+    joined = present - stored.keys()
+    returned = {user_id for user_id in present & stored.keys() if stored[user_id]}
+    departed = {user_id for user_id, left in stored.items() if not left and user_id not in present}
+    arrived = joined | returned
+
+    # Merge legacy memberships first, like add_user_to_database does
+    if Compatibility.enabled:
+        for user_id in joined:
+            await get_member(guild.id, user_id)
+
+    operations = [
+        upsert_member(guild.id, user_id,
+            {'$setOnInsert': {'join_date': now, 'experience': 0},
+             '$unset': ARRIVAL})
+        for user_id in arrived
+    ] + [
+        UpdateOne(member_filter(guild.id, user_id), {'$set': departure(now)})
+        for user_id in departed
+    ]
+    if operations:
+        await db['Members'].bulk_write(operations, ordered=False)
+    if arrived:
+        await db['Users'].bulk_write([
+            UpdateOne({'_id': user_id}, {'$unset': ARRIVAL}, upsert=True)
+            for user_id in arrived
+        ], ordered=False)
+    if departed:
+        await expire_disconnected_users(departed, now)
+
+    return len(present), len(operations)
@@ -52,6 +52,13 @@ class Menu():
         all_embedded: :class:`bool`
             Whether all pages created by the menu itself will be embeds.
 
+        Lazy Page Attributes:
+        ---------------------
+        page_loader: :class:`Callable`
+            Coroutine function taking a page number and returning the page
+            (as `Page`, str or list) for it. Items in `pages` that are None
+            are only loaded through it once they are navigated to.
+
         Input Attributes:
         -----------------
         If input variables are given then extra tasks will be added, when these
@@ -102,6 +109,7 @@ class Menu():
 
         self.all_embedded = kwargs.get('all_embedded', False)
 
+        self.page_loader = kwargs.get('page_loader', None)
         self.update(pages=pages)
 
         # Input & Asyncio options
@@ -245,8 +253,17 @@ class Menu():
             self.pages = pages
 
         for itr, page in enumerate(self.pages):
+            if page is None and self.page_loader:
+                continue
             self.pages[itr] = self.update_page(page)
 
+    async def load_page(self):
+        '''Load the current page through `page_loader` if it is not loaded yet'''
+
+        if self.current_page is None:
+            page = await self.page_loader(self.current_page_number)
+            self.pages[self.current_page_number-1] = self.update_page(page)
+
     def _check_selector(self, payload: discord.RawReactionActionEvent) -> bool:
         '''
         Checks whether payload should be processed as a input selector
@@ -332,6 +349,7 @@ class Menu():
                 await self.message.delete()
                 new = True
 
+        await self.load_page()
         content, embed = self.current_content, self.current_embed
         if new:
             self.message = await self.channel.send(content=content, embed=embed)
@@ -466,6 +484,7 @@ class Menu():
         '''Decorator to update the message'''
         async def update_message_wrapper(self):
             await func(self)
+            await self.load_page()
             try:
                 await self.message.edit(content=self.current_content, embed=self.current_embed)
             except discord.NotFound:
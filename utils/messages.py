@@ -0,0 +1,117 @@
+import asyncio
+import collections
+import discord
+import time
+from utils.constants import MESSAGE_ALIVE_TTL, MESSAGE_VERIFY_CONCURRENCY
+
+
+class MessageTracker():
+    '''
+    Tracks whether stored messages (polls, events, role managers) still
+    exist without fetching every one of them on every check.
+
+    Messages are known to be alive for `alive_ttl` seconds after they were
+    last seen, and known to be dead as soon as a delete event for them
+    arrives. Everything else is verified grouped by channel: channels are
+    checked concurrently, at most `concurrency` at a time, while the
+    messages of one channel are fetched one after another since they
+    share a rate limit bucket.
+
+    Attributes:
+    -----------
+        fetches: :class:`int`
+            Amount of messages fetched over REST.
+        rate_limited: :class:`int`
+            Amount of fetches that were rate limited and left unverified.
+    '''
+
+    MAX_DELETED = 10000  # Remembered deletes
+
+    def __init__(self, alive_ttl: float=MESSAGE_ALIVE_TTL,
+                 concurrency: int=MESSAGE_VERIFY_CONCURRENCY):
+        self.alive_ttl = alive_ttl
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._alive = {}
+        self._deleted = collections.OrderedDict()
+
+        self.fetches = 0
+        self.rate_limited = 0
+
+    def mark_alive(self, message_id: int):
+        self._alive[message_id] = time.monotonic() + self.alive_ttl
+        self._deleted.pop(message_id, None)
+
+    def mark_deleted(self, message_id: int):
+        self._alive.pop(message_id, None)
+        self._deleted[message_id] = None
+        if len(self._deleted) > self.MAX_DELETED:
+            self._deleted.popitem(last=False)
+
+    def known(self, message_id: int):
+        '''Return True or False if the state of a message is known, else None'''
+        if message_id in self._deleted:
+            return False
+        expiry = self._alive.get(message_id)
+        if expiry and expiry > time.monotonic():
+            return True
+        return None
+
+    async def _verify_channel(self, channel: discord.TextChannel, message_ids: list) -> set:
+        dead = set()
+        async with self._semaphore:
+            for message_id in message_ids:
+                self.fetches += 1
+                try:
+                    await channel.fetch_message(message_id)
+                except discord.NotFound:
+                    self.mark_deleted(message_id)
+                    dead.add(message_id)
+                except discord.Forbidden:
+                    pass  # Unknown, try again next time
+                except discord.HTTPException as error:
+                    if error.status != 429:
+                        raise
+                    # Still rate limited after discord.py's own retries,
+                    # leave the rest of this channel for the next check
+                    self.rate_limited += len(message_ids) - message_ids.index(message_id)
+                    break
+                else:
+                    self.mark_alive(message_id)
+        return dead
+
+    async def find_deleted(self, channels: dict, cached_messages: set=frozenset()) -> set:
+        '''
+        Find which of the given messages no longer exist.
+
+        Parameters:
+        -----------
+            channels: :class:`dict`
+                Maps channel objects to the ids of messages in them.
+            cached_messages: :class:`set`
+                Ids of messages in the bot's message cache.
+
+        Returns:
+        --------
+            deleted: :class:`set`
+                Ids of the messages that are known to be deleted.
+        '''
+
+        deleted, unknown = set(), {}
+        for channel, message_ids in channels.items():
+            for message_id in message_ids:
+                state = self.known(message_id)
+                if state is None and message_id in cached_messages:
+                    self.mark_alive(message_id)
+                elif state is False:
+                    deleted.add(message_id)
+                elif state is None:
+                    unknown.setdefault(channel, []).append(message_id)
+
+        results = await asyncio.gather(*(
+            self._verify_channel(channel, message_ids)
+            for channel, message_ids in unknown.items()
+        ))
+        return deleted.union(*results)
+
+
+message_tracker = MessageTracker()
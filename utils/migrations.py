@@ -0,0 +1,155 @@
+import asyncio
+from datetime import datetime
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError
+from utils.constants import DEPARTED_RETENTION, FMT, MIGRATION_BATCH_SIZE, MIGRATION_BATCH_DELAY
+from utils.database import db
+from utils.members import Compatibility, expire_disconnected_users, legacy_update, member_filter, MIGRATION_ID
+
+DUPLICATE_KEY = 11000
+EXPIRY_MIGRATION_ID = 'departure_expiry_migration'
+
+
+async def migrate_memberships(batch_size: int=MIGRATION_BATCH_SIZE,
+                              delay: float=MIGRATION_BATCH_DELAY) -> int:
+    '''
+    Move all `Users.servers.<guild_id>` entries to the `Members` collection.
+
+    Runs online: users are processed in batches ordered by id with a short
+    pause in between, and memberships written by the bot in the meantime
+    are merged rather than overwritten. Progress is stored in `Meta`, so an
+    interrupted migration continues where it left off.
+
+    Returns:
+    --------
+        migrated: :class:`int`
+            Amount of memberships merged by this run.
+    '''
+
+    state = await db['Meta'].find_one({'_id': MIGRATION_ID}) or {}
+    last_id = state.get('last_user_id', -1)
+    migrated = 0
+
+    while True:
+        users = await db['Users'].find(
+            {'_id': {'$gt': last_id}, 'servers': {'$exists': True, '$ne': {}}},
+            {'servers': 1}
+        ).sort('_id', 1).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+
+        # Existing memberships decide which legacy fields are still needed
+        user_ids = [user['_id'] for user in users]
+        existing = {
+            (member['guild_id'], member['user_id']): member
+            async for member in db['Members'].find({'user_id': {'$in': user_ids}})
+        }
+
+        operations = []
+        for user in users:
+            for guild_id, legacy in user['servers'].items():
+                key = (int(guild_id), user['_id'])
+                member = existing.get(key)
+                if member and member.get('migrated'):
+                    continue
+                query = {**member_filter(*key), 'migrated': {'$ne': True}}
+                operations.append(UpdateOne(query, legacy_update(legacy, member), upsert=True))
+
+        if operations:
+            try:
+                result = await db['Members'].bulk_write(operations, ordered=False)
+                migrated += result.upserted_count + result.modified_count
+            except BulkWriteError as error:
+                # Duplicates are memberships migrated concurrently by the bot
+                if any(e['code'] != DUPLICATE_KEY for e in error.details['writeErrors']):
+                    raise
+                migrated += error.details['nUpserted'] + error.details['nModified']
+
+        last_id = user_ids[-1]
+        await db['Meta'].update_one({'_id': MIGRATION_ID},
+            {'$set': {'last_user_id': last_id}}, upsert=True)
+        await asyncio.sleep(delay)
+
+    await db['Meta'].update_one({'_id': MIGRATION_ID},
+        {'$set': {'complete': True, 'completed_at': datetime.utcnow()}}, upsert=True)
+    Compatibility.enabled = False
+
+    print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+          f"Membership migration complete, {migrated} memberships migrated.")
+    return migrated
+
+
+async def drop_legacy_memberships():
+    '''Remove the legacy `servers` map from all users, only after migrating'''
+
+    state = await db['Meta'].find_one({'_id': MIGRATION_ID})
+    if not (state and state.get('complete')):
+        raise RuntimeError("Memberships have not been migrated yet.")
+    await db['Users'].update_many({'servers': {'$exists': True}}, {'$unset': {'servers': ''}})
+
+
+async def _set_expiry(collection, batch_size: int) -> int:
+    '''Give every document with a leave date a matching expiry'''
+
+    updated = 0
+    while True:
+        documents = await collection.find(
+            {'leave_date': {'$exists': True}, 'expire_at': {'$exists': False}},
+            {'leave_date': 1}
+        ).limit(batch_size).to_list(batch_size)
+        if not documents:
+            return updated
+
+        result = await collection.bulk_write([
+            UpdateOne({'_id': document['_id']},
+                {'$set': {'expire_at': document['leave_date'] + DEPARTED_RETENTION}})
+            for document in documents
+        ], ordered=False)
+        updated += result.modified_count
+
+
+async def migrate_departure_expiry(batch_size: int=MIGRATION_BATCH_SIZE) -> int:
+    '''
+    One-time migration setting `expire_at` on departed members and users,
+    after which the TTL indexes remove them.
+
+    Users that are no longer present in any guild but never got a leave
+    date are marked as departed as well. Does nothing once it completed.
+
+    Returns:
+    --------
+        updated: :class:`int`
+            Amount of documents given an expiry.
+    '''
+
+    state = await db['Meta'].find_one({'_id': EXPIRY_MIGRATION_ID})
+    if state and state.get('complete'):
+        return 0
+
+    updated = await _set_expiry(db['Members'], batch_size)
+    updated += await _set_expiry(db['Users'], batch_size)
+
+    # Users not connected to any guild (legacy memberships are left alone),
+    # checked in batches so no query has to list every connected member
+    last_id = -1
+    while True:
+        users = await db['Users'].find(
+            {'_id': {'$gt': last_id}, 'servers': {'$in': [{}, None]},
+             'leave_date': {'$exists': False}},
+            {'_id': 1}
+        ).sort('_id', 1).limit(batch_size).to_list(batch_size)
+        if not users:
+            break
+        user_ids = [user['_id'] for user in users]
+        updated += await expire_disconnected_users(user_ids)
+        last_id = user_ids[-1]
+
+    await db['Meta'].update_one({'_id': EXPIRY_MIGRATION_ID},
+        {'$set': {'complete': True, 'completed_at': datetime.utcnow()}}, upsert=True)
+    print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+          f"Departure expiry migration complete, {updated} documents updated.")
+    return updated
+
+
+if __name__ == '__main__':
+    asyncio.run(migrate_memberships())
@@ -0,0 +1,127 @@
+import asyncio
+from datetime import datetime, timedelta
+import heapq
+from utils.constants import FMT
+from utils.database import db
+from utils.members import member_filter
+
+RETRY_DELAY = timedelta(minutes=1)
+
+
+class MuteScheduler():
+    '''
+    Min-heap of pending mute expiries.
+
+    Pending mutes are loaded once with an indexed query on
+    `Members.muted_until`, afterwards `schedule` and `cancel` keep the
+    heap up to date. `run` sleeps until the next expiry (or forever when
+    nothing is pending) and is woken up whenever the heap changes. A mute
+    that could not be lifted is tried again `RETRY_DELAY` later.
+
+    Attributes:
+    -----------
+        expired: :class:`int`
+            Amount of mutes lifted by the scheduler.
+    '''
+
+    def __init__(self, collection):
+        self.collection = collection
+        self._heap = []
+        self._mutes = {}
+        self._stored = {}  # `muted_until` as stored, for mutes being retried
+        self._changed = asyncio.Event()
+        self.expired = 0
+
+    def __len__(self) -> int:
+        return len(self._mutes)
+
+    async def load(self):
+        '''Load all pending mutes from the database'''
+        self._heap.clear()
+        self._mutes.clear()
+        self._stored.clear()
+        async for member in self.collection.find({'muted_until': {'$exists': True}},
+                                                 {'guild_id': 1, 'user_id': 1, 'muted_until': 1}):
+            self.schedule(member['guild_id'], member['user_id'], member['muted_until'])
+
+    def schedule(self, guild_id: int, user_id: int, muted_until: datetime):
+        '''Add or move the expiry of a mute'''
+        key = (guild_id, user_id)
+        self._stored.pop(key, None)
+        self._push(key, muted_until)
+
+    def _push(self, key: tuple, due: datetime):
+        self._mutes[key] = due
+        heapq.heappush(self._heap, (due, key))
+        self._changed.set()
+
+    def cancel(self, guild_id: int, user_id: int):
+        '''Forget a mute, its heap entry is skipped once it comes up'''
+        self._stored.pop((guild_id, user_id), None)
+        if self._mutes.pop((guild_id, user_id), None):
+            self._changed.set()
+
+    def _next(self):
+        '''Drop stale heap entries and return the next pending one'''
+        while self._heap:
+            muted_until, key = self._heap[0]
+            if self._mutes.get(key) == muted_until:
+                return muted_until, key
+            heapq.heappop(self._heap)
+        return None
+
+    async def run(self, on_expire):
+        '''
+        Lift mutes as they expire, forever.
+
+        Parameters:
+        -----------
+            on_expire: :class:`Callable[[int, int], Awaitable]`
+                Called with the guild and user id of every expired mute,
+                before `muted_until` is removed from the membership.
+        '''
+
+        while True:
+            try:
+                await self.load()
+            except Exception as error:
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"Could not load pending mutes: {error}")
+                await asyncio.sleep(RETRY_DELAY.total_seconds())
+            else:
+                break
+
+        while True:
+            pending = self._next()
+            timeout = None
+            if pending:
+                timeout = (pending[0] - datetime.utcnow()).total_seconds()
+
+            if timeout is None or timeout > 0:
+                self._changed.clear()
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+
+            due, key = pending
+            heapq.heappop(self._heap)
+            del self._mutes[key]
+            muted_until = self._stored.pop(key, due)
+            try:
+                await on_expire(*key)
+                # Only clear the mute that expired, not a newer one
+                await self.collection.update_one(
+                    {**member_filter(*key), 'muted_until': muted_until},
+                    {'$unset': {'muted_until': ''}})
+            except Exception as error:
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"Could not lift mute of {key[1]} in guild {key[0]}: {error}")
+                self._stored[key] = muted_until
+                self._push(key, datetime.utcnow() + RETRY_DELAY)
+            else:
+                self.expired += 1
+
+
+mute_scheduler = MuteScheduler(db['Members'])
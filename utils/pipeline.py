@@ -0,0 +1,137 @@
+from datetime import datetime
+import discord
+import time
+import traceback
+from typing import Callable
+from utils.cache import server_cache
+from utils.constants import FMT
+
+
+class MessageContext():
+    '''
+    Shared state handed to every stage of the message pipeline.
+
+    Attributes:
+    -----------
+        message: :class:`discord.Message`
+            The message being processed.
+        server: :class:`dict`
+            Server document of the message's guild, loaded once per message.
+        timings: :class:`dict`
+            Seconds spent in each stage that ran, keyed by stage name.
+        stopped: :class:`bool`
+            Whether a stage has short-circuited the remaining stages.
+    '''
+
+    __slots__ = ('message', 'server', 'timings', 'stopped', 'reason')
+
+    def __init__(self, message: discord.Message, server: dict):
+        self.message = message
+        self.server = server
+        self.timings = {}
+        self.stopped = False
+        self.reason = None
+
+    @property
+    def guild(self) -> discord.Guild:
+        return self.message.guild
+
+    @property
+    def author(self) -> discord.Member:
+        return self.message.author
+
+    @property
+    def channel(self) -> discord.TextChannel:
+        return self.message.channel
+
+    def stop(self, reason: str=None):
+        '''Prevent any later stage from running on this message'''
+        self.stopped = True
+        self.reason = reason
+
+
+class MessagePipeline():
+    '''
+    Ordered set of stages run over every guild message.
+
+    Stages are coroutine functions taking a `MessageContext`, they run
+    in ascending `order` until one of them calls `context.stop()`.
+    '''
+
+    def __init__(self):
+        self._stages = []
+        self.stats = {}
+
+    @property
+    def stages(self) -> list:
+        return [name for _, name, _ in self._stages]
+
+    def register(self, name: str, order: int, stage: Callable):
+        '''
+        Add or replace a stage.
+
+        Parameters:
+        -----------
+            name: :class:`str`
+                Unique name of the stage, used in timings and stats.
+            order: :class:`int`
+                Position of the stage, lower runs first.
+            stage: :class:`Callable`
+                Coroutine function taking a `MessageContext`.
+        '''
+
+        self.unregister(name)
+        self._stages.append((order, name, stage))
+        self._stages.sort(key=lambda entry: (entry[0], entry[1]))
+        self.stats.setdefault(name, {'runs': 0, 'total': 0.0, 'max': 0.0})
+
+    def unregister(self, name: str):
+        '''Remove a stage if it is registered'''
+        self._stages = [entry for entry in self._stages if entry[1] != name]
+
+    async def run(self, message: discord.Message) -> MessageContext:
+        '''
+        Run all stages over a message.
+
+        Returns:
+        --------
+            context: :class:`MessageContext`
+                Context after processing, None if the message was not
+                eligible (DMs, bots or unknown guilds).
+        '''
+
+        if (
+            message.author.bot or
+            not isinstance(message.channel, discord.TextChannel) or
+            not self._stages
+        ):
+            return None
+
+        server = await server_cache.get(message.guild.id)
+        if not server:
+            return None
+
+        context = MessageContext(message, server)
+        for _, name, stage in list(self._stages):
+            start = time.perf_counter()
+            try:
+                await stage(context)
+            except Exception:
+                # A failing stage should not take the other stages down with it
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"Message stage {name} failed on message {message.id}")
+                traceback.print_exc()
+            finally:
+                elapsed = time.perf_counter() - start
+                context.timings[name] = elapsed
+                stats = self.stats[name]
+                stats['runs'] += 1
+                stats['total'] += elapsed
+                stats['max'] = max(stats['max'], elapsed)
+            if context.stopped:
+                break
+
+        return context
+
+
+message_pipeline = MessagePipeline()
@@ -0,0 +1,356 @@
+import asyncio
+from datetime import datetime
+import discord
+import math
+from pymongo import ASCENDING, DeleteMany, UpdateOne
+import time
+from utils.cache import server_cache
+from utils.constants import (FMT, NUMBER_EMOTES_DISCORD, NUMBER_EMOTES_UNICODE,
+                             POLL_RENDER_INTERVAL, TOTAL_BARS)
+from utils.database import db
+
+
+def poll_embed(title: str, queries: list, counts: list) -> discord.Embed:
+    '''Render a poll with a bar per query'''
+
+    embed = discord.Embed(title=f":bar_chart: {title}")
+    total_votes = sum(counts)
+    for ind, (query, total) in enumerate(zip(queries, counts)):
+        fraction = total/total_votes if total_votes else 0
+
+        emote = NUMBER_EMOTES_DISCORD[ind+1]
+        bars = '█'*math.ceil(fraction*TOTAL_BARS)
+        empty = ' '*(math.ceil((1-fraction)*TOTAL_BARS))
+        percentage = round(fraction*100, 2)
+
+        embed.add_field(
+            name=f"{emote} {query}",
+            value=f"`{bars}{empty}`| {percentage}% ({total})",
+            inline=False
+        )
+    return embed
+
+
+class PollTally():
+    '''
+    In-memory vote counts of a poll.
+
+    Attributes:
+    -----------
+        counts: :class:`list`
+            Amount of votes per query.
+        persisted: :class:`tuple`
+            Counts as they are stored in the database.
+        rendered: :class:`tuple`
+            Counts as they are shown in the poll message.
+        rendered_at: :class:`float`
+            Monotonic time of the last edit of the poll message.
+    '''
+
+    __slots__ = ('guild_id', 'channel', 'message_id', 'title', 'queries',
+                 'counts', 'persisted', 'rendered', 'rendered_at')
+
+    def __init__(self, guild_id: int, channel: discord.TextChannel, message_id: int,
+                 info: dict, counts: list):
+        self.guild_id = guild_id
+        self.channel = channel
+        self.message_id = message_id
+        self.title = info['title']
+        self.queries = info['queries']
+        self.counts = counts
+        self.persisted = tuple(info.get('counts') or ())
+        self.rendered = tuple(counts)
+        self.rendered_at = 0.0
+
+    @property
+    def dirty(self) -> bool:
+        return tuple(self.counts) != self.persisted
+
+
+class PollVoteStore():
+    '''
+    Durable record of who voted for what, one document per poll and user.
+
+    Votes are written as reactions arrive, results are aggregated from
+    the stored votes without asking Discord. After downtime `reconcile`
+    rebuilds the votes of a poll from the reactions of its message.
+
+    Attributes:
+    -----------
+        reconciled: :class:`int`
+            Amount of polls rebuilt from their reactions.
+    '''
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.reconciled = 0
+
+    async def ensure_indexes(self):
+        await self.collection.create_index([('poll', ASCENDING), ('user', ASCENDING)], unique=True)
+        await self.collection.create_index([('guild_id', ASCENDING)])
+
+    async def record(self, guild_id: int, poll_id: int, user_id: int, choice: int, add: bool):
+        '''Store an added (or removed) vote of a user'''
+
+        if add:
+            await self.collection.update_one({'poll': poll_id, 'user': user_id},
+                {'$addToSet': {'choices': choice}, '$setOnInsert': {'guild_id': guild_id}},
+                upsert=True)
+        else:
+            await self.collection.update_one({'poll': poll_id, 'user': user_id},
+                {'$pull': {'choices': choice}})
+
+    async def results(self, poll_id: int, size: int) -> list:
+        '''
+        Aggregate the stored votes of a poll.
+
+        Returns:
+        --------
+            counts: :class:`list`
+                Amount of votes per query, None if no votes were recorded.
+        '''
+
+        groups = await self.collection.aggregate([
+            {'$match': {'poll': poll_id}},
+            {'$unwind': {'path': '$choices', 'preserveNullAndEmptyArrays': True}},
+            {'$group': {'_id': '$choices', 'count': {'$sum': 1}}}
+        ]).to_list(None)
+        if not groups:
+            return None
+
+        counts = [0]*size
+        for group in groups:
+            if isinstance(group['_id'], int) and group['_id'] < size:
+                counts[group['_id']] = group['count']
+        return counts
+
+    async def reconcile(self, guild_id: int, message: discord.Message, size: int) -> list:
+        '''
+        Replace the stored votes of a poll with the reactions of its message.
+
+        Returns:
+        --------
+            counts: :class:`list`
+                Amount of votes per query.
+        '''
+
+        choices = {}
+        for reaction in message.reactions:
+            try:
+                ind = NUMBER_EMOTES_UNICODE.index(str(reaction.emoji))
+            except ValueError:
+                continue
+            if ind >= size:
+                continue
+            async for user in reaction.users():
+                if user.id != message.guild.me.id:
+                    choices.setdefault(user.id, []).append(ind)
+
+        operations = [DeleteMany({'poll': message.id, 'user': {'$nin': list(choices)}})]
+        operations += [UpdateOne({'poll': message.id, 'user': user_id},
+            {'$set': {'guild_id': guild_id, 'choices': sorted(user_choices)}}, upsert=True)
+            for user_id, user_choices in choices.items()]
+        await self.collection.bulk_write(operations, ordered=False)
+        self.reconciled += 1
+
+        counts = [0]*size
+        for user_choices in choices.values():
+            for ind in user_choices:
+                counts[ind] += 1
+        return counts
+
+
+class PollStore():
+    '''
+    Poll tallies kept in memory from raw reaction events.
+
+    A poll is loaded on its first reaction, from its recorded votes, the
+    counts stored in the server document or, for polls without either,
+    from the reactions of the message once. Afterwards every reaction is
+    recorded as a vote while the counts only change in memory, `flush`
+    writes changed counts back periodically.
+
+    Edits of a poll message are coalesced, a message is edited at most
+    once per `interval` seconds and always with the latest counts.
+
+    Attributes:
+    -----------
+        reactions: :class:`int`
+            Amount of votes added or removed.
+        renders: :class:`int`
+            Amount of poll message edits.
+    '''
+
+    def __init__(self, collection, votes: PollVoteStore, interval: float=POLL_RENDER_INTERVAL):
+        self.collection = collection
+        self.votes = votes
+        self.interval = interval
+        self._polls = {}
+        self._loading = {}
+        self._renders = {}
+
+        self.reactions = 0
+        self.renders = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'polls': len(self._polls),
+            'reactions': self.reactions,
+            'renders': self.renders
+        }
+
+    async def get(self, guild: discord.Guild, message_id: int) -> PollTally:
+        '''Return the tally of a poll message, None if the message is no poll'''
+        tally, _ = await self._get(guild, message_id)
+        return tally
+
+    async def _get(self, guild: discord.Guild, message_id: int) -> tuple:
+        '''Return the tally of a poll message and whether it was just rebuilt from its reactions'''
+
+        try:
+            return self._polls[message_id], False
+        except KeyError:
+            pass
+
+        server = await server_cache.get(guild.id)
+        try:
+            info = server['polls'][str(message_id)]
+        except (KeyError, TypeError):
+            return None, False  # Message not a poll
+
+        # Reactions arriving while loading share the same load
+        if message_id not in self._loading:
+            self._loading[message_id] = asyncio.ensure_future(self._load(guild, message_id, info))
+        try:
+            return await self._loading[message_id]
+        finally:
+            self._loading.pop(message_id, None)
+
+    async def _load(self, guild: discord.Guild, message_id: int, info: dict) -> tuple:
+        channel = guild.get_channel(info['channel'])
+        if not channel:
+            return None, False
+
+        counts = await self.votes.results(message_id, len(info['queries']))
+        if counts is None:
+            counts = list(info.get('counts') or ())
+        if len(counts) == len(info['queries']):
+            tally = self._polls[message_id] = PollTally(guild.id, channel, message_id, info, counts)
+            return tally, False
+
+        # Poll from before votes were recorded, rebuild them once
+        message = await channel.fetch_message(message_id)
+        counts = await self.votes.reconcile(guild.id, message, len(info['queries']))
+        tally = self._polls[message_id] = PollTally(guild.id, channel, message_id, info, counts)
+        self._track_shown(tally, message)
+        return tally, True
+
+    async def react(self, guild: discord.Guild, payload, add: bool):
+        '''Count an added (or removed) reaction on a poll message'''
+
+        tally, rebuilt = await self._get(guild, payload.message_id)
+        if not tally:
+            return
+
+        try:
+            ind = NUMBER_EMOTES_UNICODE.index(str(payload.emoji))
+        except ValueError:
+            return
+        if ind >= len(tally.counts):
+            return
+
+        # Counts rebuilt from the reactions already include this one
+        if not rebuilt:
+            tally.counts[ind] = max(tally.counts[ind] + (1 if add else -1), 0)
+        self.reactions += 1
+        self._schedule_render(tally)
+        await self.votes.record(guild.id, tally.message_id, payload.user_id, ind, add)
+
+    async def reconcile(self, guild: discord.Guild, message_id: int, info: dict):
+        '''Rebuild the votes and counts of a poll from its reactions'''
+
+        channel = guild.get_channel(info['channel'])
+        if not channel:
+            return
+        message = await channel.fetch_message(message_id)
+        counts = await self.votes.reconcile(guild.id, message, len(info['queries']))
+
+        tally = self._polls.get(message_id)
+        if tally:
+            tally.counts = counts
+        else:
+            tally = self._polls[message_id] = PollTally(guild.id, channel, message_id, info, counts)
+        self._track_shown(tally, message)
+        self._schedule_render(tally)
+
+    def _track_shown(self, tally: PollTally, message: discord.Message):
+        '''Only edit messages that show outdated counts'''
+        shown = [field.value for embed in message.embeds[:1] for field in embed.fields]
+        rendered = [field.value for field in poll_embed(tally.title, tally.queries, tally.counts).fields]
+        tally.rendered = tuple(tally.counts) if shown == rendered else ()
+
+    def _schedule_render(self, tally: PollTally):
+        if tally.message_id not in self._renders:
+            self._renders[tally.message_id] = asyncio.create_task(self._render_later(tally))
+
+    async def _render_later(self, tally: PollTally):
+        try:
+            await asyncio.sleep(max(tally.rendered_at + self.interval - time.monotonic(), 0))
+        finally:
+            self._renders.pop(tally.message_id, None)
+        await self.render(tally)
+
+    async def render(self, tally: PollTally):
+        '''Edit a poll message to show the current counts'''
+
+        counts = tuple(tally.counts)
+        if counts == tally.rendered:
+            return
+        tally.rendered, tally.rendered_at = counts, time.monotonic()
+
+        message = tally.channel.get_partial_message(tally.message_id)
+        try:
+            await message.edit(embed=poll_embed(tally.title, tally.queries, counts))
+        except discord.NotFound:
+            self.drop(tally.message_id)
+        except discord.HTTPException as error:
+            print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                  f"Could not update poll {tally.message_id}: {error}")
+        else:
+            self.renders += 1
+
+    def drop(self, message_id: int):
+        '''Forget a poll, e.g. after its message was deleted'''
+        self._polls.pop(message_id, None)
+        task = self._renders.pop(message_id, None)
+        if task:
+            task.cancel()
+
+    async def flush(self):
+        '''Write all changed counts'''
+
+        async def persist(tally, counts):
+            result = await self.collection.update_one(
+                {'_id': tally.guild_id, f'polls.{tally.message_id}': {'$exists': True}},
+                {'$set': {f'polls.{tally.message_id}.counts': list(counts)}})
+            if result.matched_count:
+                tally.persisted = counts
+            else:
+                self.drop(tally.message_id)  # Poll was removed meanwhile
+
+        dirty = [(tally, tuple(tally.counts)) for tally in self._polls.values() if tally.dirty]
+        if dirty:
+            await asyncio.gather(*(persist(*item) for item in dirty))
+
+    async def close(self):
+        '''Render pending edits and write all counts, e.g. before unloading'''
+        for task in list(self._renders.values()):
+            task.cancel()
+        self._renders.clear()
+        await asyncio.gather(*(self.render(tally) for tally in list(self._polls.values())))
+        await self.flush()
+
+
+poll_votes = PollVoteStore(db['PollVotes'])
+poll_store = PollStore(db['Servers'], poll_votes)
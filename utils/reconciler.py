@@ -0,0 +1,145 @@
+import asyncio
+from datetime import datetime
+import discord
+import time
+from utils.cache import server_cache
+from utils.constants import DEFAULT_MANAGERS, FMT, RECONCILE_CONCURRENCY
+from utils.database import db
+from utils.messages import message_tracker
+
+IMPORTANT_CHANNELS = ['spawn', 'eject', 'log', 'birthday']
+PROPERTY_CHANNELS = ['ignore', 'ignore_exp']
+
+
+class IntegrityReconciler():
+    '''
+    Removes references to roles, channels and manager messages that no
+    longer exist from server documents.
+
+    Every reference is checked against the gateway cache first, only
+    references missing from the cache are confirmed over REST. Guilds are
+    reconciled concurrently, at most `concurrency` at a time, and all
+    fixes of a guild are applied with a single `update_one`.
+
+    Attributes:
+    -----------
+        stats: :class:`dict`
+            Guilds checked, fixes applied, REST calls made and seconds
+            taken by the last pass.
+    '''
+
+    def __init__(self, bot, concurrency: int=RECONCILE_CONCURRENCY):
+        self.bot = bot
+        self.concurrency = concurrency
+        self.stats = {}
+        self._rest_calls = 0
+
+    async def run(self):
+        '''Reconcile all known guilds once'''
+
+        start = time.perf_counter()
+        self._rest_calls = 0
+        fetches = message_tracker.fetches
+        semaphore = asyncio.Semaphore(self.concurrency)
+        cached_messages = {message.id for message in self.bot.cached_messages}
+
+        async def reconcile(server):
+            async with semaphore:
+                try:
+                    return await self.reconcile_guild(server, cached_messages)
+                except Exception as error:
+                    # Database and HTTP errors alike only skip this guild
+                    print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                          f"Could not reconcile guild {server['_id']}: {error!r}")
+                    return 0
+
+        servers = await db['Servers'].find({}, {'roles': 1, 'channels': 1,
+            **{manager: 1 for manager in DEFAULT_MANAGERS}}).to_list(None)
+        fixes = await asyncio.gather(*(reconcile(server) for server in servers))
+
+        self.stats = {
+            'guilds': len(servers),
+            'fixes': sum(fixes),
+            'rest_calls': self._rest_calls + message_tracker.fetches - fetches,
+            'elapsed': time.perf_counter() - start
+        }
+        print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+              f"Reconciled {self.stats['guilds']} guilds, {self.stats['fixes']} fixes",
+              f"with {self.stats['rest_calls']} REST calls in {self.stats['elapsed']:.2f}s")
+
+    async def _channel_exists(self, guild: discord.Guild, channel_id: int) -> bool:
+        if guild.get_channel(channel_id):
+            return True
+        self._rest_calls += 1
+        try:
+            channel = await self.bot.fetch_channel(channel_id)
+        except discord.NotFound:
+            return False
+        except discord.Forbidden:
+            return True  # Exists, but is hidden from the bot
+        return getattr(channel, 'guild', guild).id == guild.id
+
+    async def reconcile_guild(self, server: dict, cached_messages: set=frozenset()) -> int:
+        '''
+        Check all stored references of a guild and remove dead ones.
+
+        Returns:
+        --------
+            fixes: :class:`int`
+                Amount of references removed.
+        '''
+
+        guild = self.bot.get_guild(server['_id'])
+        if not guild:
+            # Not in the gateway cache, the guild may be unavailable
+            self._rest_calls += 1
+            try:
+                guild = await self.bot.fetch_guild(server['_id'])
+            except (discord.NotFound, discord.Forbidden):
+                return 0
+
+        unset, pull = {}, {}
+
+        # Roles, fetched only when one is missing from the cache
+        roles = server.get('roles', {})
+        if any(not guild.get_role(role_id) for role_id in roles.values()):
+            self._rest_calls += 1
+            existing = {role.id for role in await guild.fetch_roles()}
+            for name, role_id in roles.items():
+                if role_id not in existing:
+                    unset[f'roles.{name}'] = ''
+
+        # Channels
+        channels = server.get('channels', {})
+        for name in IMPORTANT_CHANNELS:
+            if name in channels and not await self._channel_exists(guild, channels[name]):
+                unset[f'channels.{name}'] = ''
+        for name in PROPERTY_CHANNELS:
+            dead = [channel_id for channel_id in channels.get(name, [])
+                    if not await self._channel_exists(guild, channel_id)]
+            if dead:
+                pull[f'channels.{name}'] = {'$in': dead}
+
+        # Manager messages, verified grouped by channel
+        managers, message_channels = {}, {}
+        for manager_type in DEFAULT_MANAGERS:
+            for manager_id, info in server.get(manager_type, {}).items():
+                managers[int(manager_id)] = manager_type
+                channel = guild.get_channel(info.get('channel', 0))
+                if channel:
+                    message_channels.setdefault(channel, []).append(int(manager_id))
+                elif not await self._channel_exists(guild, info.get('channel', 0)):
+                    unset[f'{manager_type}.{manager_id}'] = ''
+
+        for manager_id in await message_tracker.find_deleted(message_channels, cached_messages):
+            unset[f'{managers[manager_id]}.{manager_id}'] = ''
+
+        update = {}
+        if unset:
+            update['$unset'] = unset
+        if pull:
+            update['$pull'] = pull
+        if update:
+            await db['Servers'].update_one({'_id': guild.id}, update)
+            server_cache.invalidate(guild.id)
+        return len(unset) + sum(len(dead['$in']) for dead in pull.values())
@@ -0,0 +1,99 @@
+import asyncio
+from datetime import datetime
+import discord
+from utils.constants import FMT
+
+
+class RoleUpdateQueue():
+    '''
+    Queue of role changes applied one at a time by a single worker.
+
+    Before a change is sent its need is checked against the gateway cache,
+    members that already have (or lack) the role cost no request. When a
+    request is still rate limited after discord.py's own retries the
+    worker backs off for the advertised time and tries again.
+
+    Attributes:
+    -----------
+        applied: :class:`int`
+            Amount of role requests made.
+        avoided: :class:`int`
+            Amount of role requests not needed according to the cache.
+        rate_limited: :class:`int`
+            Amount of times the worker had to back off.
+    '''
+
+    MAX_ATTEMPTS = 3
+
+    def __init__(self):
+        self._queue = None
+        self._worker = None
+
+        self.applied = 0
+        self.avoided = 0
+        self.rate_limited = 0
+
+    @property
+    def stats(self) -> dict:
+        return {
+            'pending': self._queue.qsize() if self._queue else 0,
+            'applied': self.applied,
+            'avoided': self.avoided,
+            'rate_limited': self.rate_limited
+        }
+
+    def put(self, member: discord.Member, role: discord.Role, add: bool):
+        '''Queue adding (or removing) a role, skipped if nothing would change'''
+
+        if (role in member.roles) == add:
+            self.avoided += 1
+            return
+
+        if not self._queue:
+            self._queue = asyncio.Queue()
+        self._queue.put_nowait((member, role, add))
+        if not self._worker or self._worker.done():
+            self._worker = asyncio.create_task(self._work())
+
+    async def join(self):
+        '''Wait until all queued changes were applied'''
+        if self._queue:
+            await self._queue.join()
+
+    async def _apply(self, member: discord.Member, role: discord.Role, add: bool):
+        for _ in range(self.MAX_ATTEMPTS):
+            # The cache may have changed while the change was queued
+            if (role in member.roles) == add:
+                self.avoided += 1
+                return
+            try:
+                if add:
+                    await member.add_roles(role)
+                else:
+                    await member.remove_roles(role)
+            except discord.HTTPException as error:
+                if error.status != 429:
+                    raise
+                self.rate_limited += 1
+                await asyncio.sleep(float(error.response.headers.get('Retry-After', 1)))
+            else:
+                self.applied += 1
+                return
+
+        print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+              f"Dropped role {role.id} change of {member.id} in guild {member.guild.id}",
+              f"after {self.MAX_ATTEMPTS} rate limited attempts")
+
+    async def _work(self):
+        while not self._queue.empty():
+            member, role, add = await self._queue.get()
+            try:
+                await self._apply(member, role, add)
+            except discord.HTTPException as error:
+                print(f"[{datetime.utcnow().strftime(FMT)}]\t",
+                      f"Could not update role {role.id} of {member.id}: {error}")
+            finally:
+                self._queue.task_done()
+
+
+role_updates = RoleUpdateQueue()
@@ -0,0 +1,95 @@
+import asyncio
+from bson import Binary
+from datetime import datetime
+import emoji
+import gzip
+from utils.constants import FMT, TRANSCRIPT_RETENTION
+from utils.database import db
+
+MAX_DOCUMENT_SIZE = 15 * 1024 * 1024  # Stay below MongoDB's 16MB limit
+
+
+def _message_line(created_at, author: str, channel_id: int, content: str, attachment: str) -> str:
+    # Filter emoji's and 'Zero Width Space' unicodes
+    content = emoji.demojize(content).replace('\u200b', 'ZWS')
+
+    # Add attachment url if necessary
+    if attachment and not content:
+        content = f"Attachment[{attachment}]"
+    elif attachment:
+        content += f" | Attachment[{attachment}]"
+
+    return (f"[{created_at.strftime(FMT)}] | By: {author} "
+            f"| In: {channel_id} | Containing: {content}\n\n")
+
+
+def _compress(lines: list, limit: int) -> list:
+    '''Gzip lines, splitting them into parts that are at most `limit` bytes'''
+
+    compressed = gzip.compress(''.join(lines).encode())
+    if len(compressed) <= limit or len(lines) == 1:
+        return [compressed]
+    middle = len(lines) // 2
+    return _compress(lines[:middle], limit) + _compress(lines[middle:], limit)
+
+
+def _build(header: str, rows: list, limit: int) -> list:
+    lines = [header] + [_message_line(*row) for row in rows]
+    return _compress(lines, limit)
+
+
+async def build_transcript(messages: list, deleter, limit: int) -> list:
+    '''
+    Build the gzipped transcript of a bulk delete in memory.
+
+    Only the message fields that are needed are read on the event loop,
+    formatting and compression run in the default executor.
+
+    Parameters:
+    -----------
+        messages: :class:`list`
+            The deleted messages.
+        deleter: :class:`discord.Member`
+            Member shown as the performer of the purge.
+        limit: :class:`int`
+            Maximum size of a part in bytes, usually the guild's upload limit.
+
+    Returns:
+    --------
+        parts: :class:`list`
+            Gzip compressed parts of the transcript, in order.
+    '''
+
+    header = (f"Bulk delete by {deleter.name}:{deleter.id} at "
+              f"{datetime.utcnow().strftime(FMT)}\n\n")
+    rows = [
+        (message.created_at, f"{message.author}:{message.author.id}", message.channel.id,
+         message.content, message.attachments[0].url if message.attachments else None)
+        for message in messages
+    ]
+    return await asyncio.get_running_loop().run_in_executor(None, _build, header, rows, limit)
+
+
+async def ensure_transcript_indexes():
+    '''Expire retained transcripts, only needed when retention is enabled'''
+    if TRANSCRIPT_RETENTION:
+        await db['Transcripts'].create_index('created_at', expireAfterSeconds=TRANSCRIPT_RETENTION)
+
+
+async def retain_transcript(guild_id: int, channel_id: int, deleter_id: int, parts: list) -> bool:
+    '''
+    Store a transcript in the `Transcripts` collection, where it expires
+    after `TRANSCRIPT_RETENTION` seconds. Does nothing when retention is
+    disabled or the transcript is too large for a single document.
+    '''
+
+    if not TRANSCRIPT_RETENTION or sum(len(part) for part in parts) > MAX_DOCUMENT_SIZE:
+        return False
+    await db['Transcripts'].insert_one({
+        'guild_id': guild_id,
+        'channel_id': channel_id,
+        'deleter_id': deleter_id,
+        'created_at': datetime.utcnow(),
+        'parts': [Binary(part) for part in parts]
+    })
+    return True
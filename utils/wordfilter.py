@@ -0,0 +1,141 @@
+import re
+from utils.constants import BANNED_WORDS_AUTOMATON_SIZE
+
+
+class RegexMatcher():
+    '''
+    Matches a list of banned word patterns with a single compiled
+    alternation. The entries responsible for a match are only looked up
+    once something matched, so clean messages cost one scan.
+
+    Patterns that cannot share an alternation, e.g. ones with inline
+    global flags or reusing a group name, are searched one by one.
+    '''
+
+    def __init__(self, words: list):
+        self.words = list(words)
+        self._patterns = []
+        for word in self.words:
+            try:
+                pattern = re.compile(word, re.IGNORECASE)
+            except re.error:
+                # Broken patterns are matched literally
+                pattern = re.compile(re.escape(word), re.IGNORECASE)
+            self._patterns.append(pattern)
+        try:
+            self.pattern = re.compile('|'.join(f"(?:{p.pattern})" for p in self._patterns), re.IGNORECASE)
+        except re.error:
+            self.pattern = None
+
+    def find(self, text: str) -> list:
+        '''Return the banned words found in `text` in order of appearance'''
+        if self.pattern and not self.pattern.search(text):
+            return []
+
+        # Every pattern is searched in the full text, so lookarounds and
+        # overlapping entries behave as if matched on their own
+        hits = {}
+        for word, pattern in zip(self.words, self._patterns):
+            match = pattern.search(text)
+            if match and word not in hits:
+                hits[word] = match.start()
+        return sorted(hits, key=hits.get)
+
+
+class AhoCorasickMatcher():
+    '''
+    Matches a large list of literal banned words in a single pass over
+    the text, regardless of the amount of words.
+    '''
+
+    def __init__(self, words: list):
+        self.words = list(words)
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+
+        for word in self.words:
+            state = 0
+            for char in word.lower():
+                try:
+                    state = self._goto[state][char]
+                except KeyError:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._output.append([])
+                    self._goto[state][char] = state = len(self._goto) - 1
+            self._output[state].append(word)
+
+        # Breadth first construction of the failure links
+        queue = list(self._goto[0].values())
+        for state in queue:
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fail = self._fail[state]
+                while fail and char not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[next_state] = self._goto[fail].get(char, 0)
+                self._output[next_state] += self._output[self._fail[next_state]]
+
+    def find(self, text: str) -> list:
+        '''Return the banned words found in `text` in order of appearance'''
+        goto, fail, output = self._goto, self._fail, self._output
+        hits = {}
+        state = 0
+        for char in text.lower():
+            while state and char not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(char, 0)
+            for word in output[state]:
+                hits[word] = None
+        return list(hits)
+
+
+def compile_matcher(words: list):
+    '''
+    Compile a guild's banned words into a matcher.
+
+    Large lists of plain words use an Aho-Corasick automaton, anything
+    else (including lists containing regular expressions) a single
+    regex alternation.
+    '''
+
+    words = [word for word in words if word]
+    if not words:
+        return None
+    if len(words) >= BANNED_WORDS_AUTOMATON_SIZE and all(re.escape(word) == word for word in words):
+        return AhoCorasickMatcher(words)
+    return RegexMatcher(words)
+
+
+class MatcherCache():
+    '''
+    Compiled banned word matchers per guild.
+
+    A matcher is rebuilt when the guild's list differs from the one it was
+    compiled from, `invalidate` forces a rebuild after `ban_word`.
+    '''
+
+    def __init__(self):
+        self._matchers = {}
+        self.builds = 0
+
+    def get(self, guild_id: int, words: list):
+        try:
+            cached_words, matcher = self._matchers[guild_id]
+        except KeyError:
+            pass
+        else:
+            if cached_words == words:
+                return matcher
+
+        matcher = compile_matcher(words)
+        self._matchers[guild_id] = (list(words), matcher)
+        self.builds += 1
+        return matcher
+
+    def invalidate(self, guild_id: int):
+        self._matchers.pop(guild_id, None)
+
+
+banned_word_matchers = MatcherCache()